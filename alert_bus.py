@@ -0,0 +1,267 @@
+import json
+import time
+import heapq
+import threading
+import urllib.request
+from collections import deque, namedtuple
+
+import numpy as np
+
+# One sign event. kind is "alert" when a sign is first announced and
+# "reminder" when a scheduled reminder comes due. time is the wall clock time
+# it was published, timestamp and frame identify the source frame.
+SignEvent = namedtuple('SignEvent', ['kind', 'name', 'class_id', 'conf', 'box', 'timestamp', 'frame', 'thumbnail', 'time'])
+
+# What a full sink queue does with a new event
+DROP_OLDEST = 'oldest'  # Discard the oldest queued event, stale alerts are worthless
+DROP_NEWEST = 'newest'  # Discard the new event, keep the order of what is queued
+
+
+def event_record(event):
+    # JSON-friendly form of an event, without the thumbnail
+    return {'kind': event.kind, 'sign': event.name, 'class_id': int(event.class_id),
+            'confidence': round(float(event.conf), 4), 'box': [int(v) for v in event.box],
+            'timestamp': event.timestamp, 'frame': event.frame, 'time': event.time}
+
+
+class Sink:
+    # A consumer of sign events with its own bounded queue. Threaded sinks get
+    # one worker thread that calls handle(); polled sinks are drained by the
+    # owner with poll(), e.g. a UI that must update on its own thread. Only
+    # events whose kind is in kinds are queued, and nothing while disabled.
+    # close() lets the worker finish what is queued before release() frees
+    # the sink's file or connection.
+    name = 'sink'
+    threaded = True
+
+    def __init__(self, max_queue=16, drop=DROP_OLDEST, kinds=('alert', 'reminder')):
+        self.max_queue = max_queue
+        self.drop = drop
+        self.kinds = kinds
+        self.enabled = True
+        self.delivered = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error = None
+        self.lags = deque(maxlen=100)  # Seconds from publish to handled
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = None
+
+    def offer(self, event):
+        # Called by the bus on the publishing thread, never blocks
+        if not self.enabled or event.kind not in self.kinds:
+            return
+        with self._condition:
+            if self._closed:
+                return
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                if self.drop == DROP_NEWEST:
+                    return
+                self._queue.popleft()
+            self._queue.append(event)
+            self._condition.notify()
+
+    def poll(self):
+        # Drain the queue without waiting
+        with self._condition:
+            events = [event for event in self._queue if event is not None]
+            self._queue.clear()
+        now = time.time()
+        self.lags.extend(now - event.time for event in events)
+        self.delivered += len(events)
+        return events
+
+    def start(self):
+        if self.threaded:
+            self._thread = threading.Thread(target=self.run, daemon=True)
+            self._thread.start()
+
+    def run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._queue)
+                event = self._queue.popleft()
+            if event is None:  # Sentinel queued by close()
+                return
+            try:
+                self.handle(event)
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)
+            self.lags.append(time.time() - event.time)
+            self.delivered += 1
+
+    def handle(self, event):
+        raise NotImplementedError
+
+    def release(self):
+        # Free files or connections, called once the worker has stopped
+        pass
+
+    def close(self, timeout=5.0):
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.append(None)
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                print(f'Alert sink {self.name} did not finish its queue within {timeout:g} s')
+                return  # Still inside handle(), leave its resources alone
+        self.release()
+
+    def metrics(self):
+        lags = np.array(self.lags) * 1000 if self.lags else np.zeros(1)
+        return {'queued': len(self._queue), 'delivered': self.delivered, 'dropped': self.dropped,
+                'errors': self.errors, 'last_error': self.last_error,
+                'lag_p50_ms': round(float(np.percentile(lags, 50)), 1), 'lag_max_ms': round(float(lags.max()), 1)}
+
+
+class OverlaySink(Sink):
+    # Polled by the frontend on its display thread to update notification panels
+    name = 'overlay'
+    threaded = False
+
+
+class TtsSink(Sink):
+    # Speaks alerts. The pyttsx3 engine is created on the worker thread that
+    # uses it, and only the newest queued alert is kept when speech lags.
+    name = 'tts'
+
+    def __init__(self, rate=150, max_queue=1, drop=DROP_OLDEST, kinds=('alert',)):
+        super().__init__(max_queue, drop, kinds)
+        self.rate = rate
+        self.engine = None
+
+    def handle(self, event):
+        if self.engine is None:
+            import pyttsx3
+            self.engine = pyttsx3.init()
+            self.engine.setProperty('rate', self.rate)
+        self.engine.say(event.name)
+        self.engine.runAndWait()
+
+
+class FileSink(Sink):
+    # Appends every event as one JSON line
+    name = 'file'
+
+    def __init__(self, path, max_queue=256, drop=DROP_NEWEST, kinds=('alert', 'reminder')):
+        super().__init__(max_queue, drop, kinds)
+        self.file = open(path, 'a')
+
+    def handle(self, event):
+        self.file.write(json.dumps(event_record(event)) + '\n')
+        self.file.flush()
+
+    def release(self):
+        self.file.close()
+
+
+class MqttSink(Sink):
+    # Publishes every event as JSON to a local broker. Needs paho-mqtt; the
+    # client reconnects on its own, publishing while disconnected is dropped.
+    name = 'mqtt'
+
+    def __init__(self, host='localhost', port=1883, topic='traffic_signs/events',
+                 max_queue=64, drop=DROP_OLDEST, kinds=('alert', 'reminder')):
+        try:
+            import paho.mqtt.client as mqtt
+        except ImportError:
+            raise ValueError('The MQTT alert sink needs paho-mqtt, install it with "pip install paho-mqtt".')
+        super().__init__(max_queue, drop, kinds)
+        self.topic = topic
+        if hasattr(mqtt, 'CallbackAPIVersion'):
+            self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        else:
+            self.client = mqtt.Client()
+        self.client.connect_async(host, port)
+        self.client.loop_start()
+
+    def handle(self, event):
+        info = self.client.publish(self.topic, json.dumps(event_record(event)), qos=0)
+        if info.rc != 0:
+            raise ConnectionError(f'MQTT publish failed with code {info.rc}')
+
+    def release(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+
+
+class WebhookSink(Sink):
+    # POSTs every event as JSON to a URL
+    name = 'webhook'
+
+    def __init__(self, url, timeout=2.0, max_queue=32, drop=DROP_OLDEST, kinds=('alert', 'reminder')):
+        super().__init__(max_queue, drop, kinds)
+        self.url = url
+        self.timeout = timeout
+
+    def handle(self, event):
+        request = urllib.request.Request(self.url, data=json.dumps(event_record(event)).encode(),
+                                         headers={'Content-Type': 'application/json'}, method='POST')
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class AlertBus:
+    # Fans sign events out to sinks without ever blocking the publisher: each
+    # sink has its own bounded queue and worker, so a slow or failing sink
+    # only drops its own events. Reminders wait in one heap and are published
+    # by tick(), which the frame loop calls every frame. clock gives the time
+    # reminders are due on, e.g. frame timestamps when replaying a recording.
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.sinks = []
+        self._pending = []  # Heap of (due time, sequence, event)
+        self._pending_names = set()
+        self._sequence = 0
+
+    def add(self, sink):
+        self.sinks.append(sink)
+        sink.start()
+        return sink
+
+    def publish(self, event):
+        for sink in self.sinks:
+            sink.offer(event)
+
+    def schedule(self, event, delay):
+        # Publish event after delay seconds on the bus clock, returns False if
+        # a reminder for the same sign is already pending
+        if event.name in self._pending_names:
+            return False
+        self._pending_names.add(event.name)
+        self._sequence += 1
+        heapq.heappush(self._pending, (self.clock() + delay, self._sequence, event))
+        return True
+
+    def cancel_scheduled(self):
+        self._pending.clear()
+        self._pending_names.clear()
+
+    def tick(self):
+        # Publish the reminders that are due
+        now = self.clock()
+        while self._pending and self._pending[0][0] <= now:
+            _, _, event = heapq.heappop(self._pending)
+            self._pending_names.discard(event.name)
+            self.publish(event._replace(time=time.time()))
+
+    def metrics(self):
+        return {sink.name: sink.metrics() for sink in self.sinks}
+
+    def report(self):
+        return '\n'.join(f'Alert sink {name}: {m["delivered"]} delivered, {m["dropped"]} dropped, '
+                         f'{m["errors"]} errors, lag p50 {m["lag_p50_ms"]} ms, max {m["lag_max_ms"]} ms'
+                         for name, m in self.metrics().items())
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
@@ -0,0 +1,121 @@
+import os
+import time
+import json
+import queue
+import argparse
+import platform
+import multiprocessing as mp
+
+import cv2
+import numpy as np
+
+from frame_sources import ThreadedSource, open_source
+from preprocess import Letterbox, parse_imgsz
+from detections import run_detector
+from tuning import MAIN_STAGES, TUNING_FILE, STAGES, apply_tuning, available_cores, describe
+
+# Sweep torch and OpenCV thread counts and core pinning of the inference,
+# capture and render stages on this machine, and save the fastest setup to
+# tuning.json for yolo_detect.py and gui_app.py, e.g.
+#   python autotune.py --model my_model.pt --source synthetic:test_dir@30 --frames 100
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--model', help='Path to YOLO model file (example: "my_model.pt")', required=True)
+parser.add_argument('--source', help='Frame source, see yolo_detect.py --source (default: "synthetic")',
+                    default='synthetic')
+parser.add_argument('--frames', help='Number of frames to time per configuration (default: 100)', type=int, default=100)
+parser.add_argument('--imgsz', help='Inference input size (default: 640)', default='640')
+parser.add_argument('--resolution', help='Frame resolution in WxH (default: 1280x720)', default='1280x720')
+parser.add_argument('--output', help=f'Profile file to write (default: {TUNING_FILE})', default=TUNING_FILE)
+args = parser.parse_args()
+
+imgsz = parse_imgsz(args.imgsz)
+resolution = tuple(int(v) for v in args.resolution.split('x'))
+
+
+def candidates():
+    # Every stage on every core, or capture on a core of its own (the last
+    # one) with inference and render sharing the rest
+    cores = available_cores()
+    layouts = [{stage: cores for stage in STAGES}]
+    if len(cores) >= 2:
+        layouts.append({'inference': cores[:-1], 'capture': cores[-1:], 'render': cores[:-1]})
+    for layout in layouts:
+        for torch_threads in range(1, len(layout['inference']) + 1):
+            for cv2_threads in sorted({1, len(layout['render'])}):
+                yield {'torch_threads': torch_threads, 'cv2_threads': cv2_threads,
+                       **{stage + '_cores': layout[stage] for stage in STAGES}}
+
+
+def measure(tuning, results):
+    # Runs in a fresh process, so thread pools and affinity of one
+    # configuration never carry over into the next
+    from ultralytics import YOLO
+
+    apply_tuning(tuning, MAIN_STAGES)
+    model = YOLO(args.model, task='detect')
+    letterbox = Letterbox(imgsz)
+    source = ThreadedSource(open_source(args.source, resolution=resolution, imgsz=imgsz),
+                            cores=tuning['capture_cores'])
+    first = source.read(timeout=5)
+    if first is None:
+        source.close()
+        results.put(None)
+        return
+    for _ in range(3):  # Warm up
+        run_detector(model, [letterbox], [first.infer_image], imgsz)
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(args.frames):
+        captured = source.read(timeout=5)
+        if captured is None:
+            break
+        t_frame = time.perf_counter()
+        boxes, _, _ = run_detector(model, [letterbox], [captured.infer_image], imgsz)[0]
+        # Stand-in for the drawing and overlay work of the display loop
+        frame = cv2.resize(captured.image, resolution)
+        for xmin, ymin, xmax, ymax in boxes.astype(int):
+            cv2.rectangle(frame, (xmin, ymin), (xmax, ymax), (0, 255, 0), 2)
+        cv2.addWeighted(frame.copy(), 0.7, frame, 0.3, 0, frame)
+        latencies.append(time.perf_counter() - t_frame)
+    elapsed = time.perf_counter() - start
+    source.close()
+    results.put((len(latencies) / elapsed, float(np.percentile(latencies, 95)) * 1000) if latencies else None)
+
+
+if __name__ == '__main__':
+    # Fork where available, the parent never loads torch so there are no
+    # thread pools to copy
+    ctx = mp.get_context('fork' if 'fork' in mp.get_all_start_methods() else 'spawn')
+    best = None
+    for tuning in candidates():
+        results = ctx.Queue()
+        worker = ctx.Process(target=measure, args=(tuning, results))
+        worker.start()
+        result = None
+        while worker.is_alive() or not results.empty():
+            try:
+                result = results.get(timeout=1)
+                break
+            except queue.Empty:
+                pass
+        worker.join()
+        if result is None:
+            print(f'Could not measure {describe(tuning)} (exit code {worker.exitcode})')
+            continue
+        fps, p95 = result
+        print(f'{fps:7.1f} fps   p95 {p95:6.1f} ms   {describe(tuning)}')
+        # Highest frame rate wins, within 2% the lower tail latency does
+        if best is None or fps > best['fps'] * 1.02 or (fps > best['fps'] * 0.98 and p95 < best['p95_ms']):
+            best = {**tuning, 'fps': round(fps, 1), 'p95_ms': round(p95, 1)}
+
+    if best is None:
+        print('No configuration could be measured.')
+    else:
+        best.update(cpu_count=os.cpu_count(), machine=platform.node(), model=args.model,
+                    imgsz=list(imgsz), tuned_at=time.strftime('%Y-%m-%d %H:%M:%S'))
+        with open(args.output, 'w') as f:
+            json.dump(best, f, indent=2)
+        print(f'Best: {best["fps"]} fps, p95 {best["p95_ms"]} ms with {describe(best)}')
+        print(f'Saved to {args.output}')
@@ -0,0 +1,89 @@
+import sys
+import time
+import argparse
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+from frame_sources import open_source
+from preprocess import Letterbox, parse_imgsz, scale_boxes
+from detections import run_detector
+from shm_pipeline import Pipeline
+
+# Compare throughput of the single-process loop in yolo_detect.py with the
+# shared-memory multiprocess pipeline, e.g.
+#   python bench_pipeline.py --model my_model.pt --source synthetic:test_dir@30 --frames 300
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--model', help='Path to YOLO model file (example: "my_model.pt")', required=True)
+parser.add_argument('--source', help='Frame source, see yolo_detect.py --source (default: "synthetic@30")',
+                    default='synthetic@30')
+parser.add_argument('--frames', help='Number of frames to process per mode (default: 300)', type=int, default=300)
+parser.add_argument('--imgsz', help='Inference input size (default: 640)', default='640')
+parser.add_argument('--resolution', help='Frame resolution in WxH (default: 1280x720)', default='1280x720')
+args = parser.parse_args()
+
+imgsz = parse_imgsz(args.imgsz)
+resolution = tuple(int(v) for v in args.resolution.split('x'))
+
+
+def draw(frame, boxes):
+    # Stand-in for the drawing and overlay work of the display loop
+    display_frame = frame.copy()
+    for xmin, ymin, xmax, ymax in boxes.astype(int):
+        cv2.rectangle(display_frame, (xmin, ymin), (xmax, ymax), (0, 255, 0), 2)
+    overlay = display_frame.copy()
+    cv2.addWeighted(overlay, 0.7, display_frame, 0.3, 0, display_frame)
+
+
+def report(name, latencies, elapsed, dropped=0):
+    latencies = np.array(latencies) * 1000
+    print(f'{name:<14} {len(latencies) / elapsed:7.1f} fps   mean {latencies.mean():6.1f} ms   '
+          f'p95 {np.percentile(latencies, 95):6.1f} ms   dropped {dropped}')
+
+
+def run_single():
+    model = YOLO(args.model, task='detect')
+    source = open_source(args.source, resolution=resolution, imgsz=imgsz)
+    letterbox = Letterbox(imgsz)
+    run_detector(model, [letterbox], [source.read().infer_image], imgsz)  # Warm up
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(args.frames):
+        t_frame = time.perf_counter()
+        captured = source.read()
+        if captured is None:
+            break
+        frame = cv2.resize(captured.image, resolution)
+        boxes, _, _ = run_detector(model, [letterbox], [captured.infer_image], imgsz)[0]
+        draw(frame, scale_boxes(boxes, captured.infer_image.shape, frame.shape))
+        latencies.append(time.perf_counter() - t_frame)
+    report('single', latencies, time.perf_counter() - start)
+    source.close()
+
+
+def run_multiprocess():
+    pipeline = Pipeline(args.source, args.model, imgsz, resolution=resolution)
+    try:
+        if pipeline.read(timeout=60) is None:  # Warm up, waits for the model to load
+            sys.exit('Source produced no frames.')
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(args.frames):
+            t_frame = time.perf_counter()
+            result = pipeline.read()
+            if result is None:
+                break
+            captured, boxes, _, _ = result
+            draw(captured.image, boxes)
+            latencies.append(time.perf_counter() - t_frame)
+        report('multiprocess', latencies, time.perf_counter() - start, pipeline.frames_dropped)
+    finally:
+        pipeline.close()
+
+
+if __name__ == '__main__':
+    run_single()
+    run_multiprocess()
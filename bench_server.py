@@ -0,0 +1,75 @@
+import time
+import argparse
+import threading
+
+import cv2
+import numpy as np
+
+from frame_sources import open_source
+from inference_server import RemoteDetector
+
+# Load generator for inference_server.py. Every client thread sends frames
+# back to back and the run reports throughput and tail latency, e.g.
+#   python bench_server.py --server http://127.0.0.1:8765 --clients 8 --requests 200
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--server', help='Server address, "http://host:port" or "unix:/path" (default: http://127.0.0.1:8765)',
+                    default='http://127.0.0.1:8765')
+parser.add_argument('--source', help='Frames to send, see yolo_detect.py --source (default: "synthetic@30")',
+                    default='synthetic@30')
+parser.add_argument('--clients', help='Number of concurrent clients (default: 4)', type=int, default=4)
+parser.add_argument('--requests', help='Requests per client (default: 100)', type=int, default=100)
+parser.add_argument('--frames', help='Distinct frames to cycle through (default: 30)', type=int, default=30)
+args = parser.parse_args()
+
+# Encode the frames once so the clients measure the server, not JPEG encoding
+source = open_source(args.source)
+payloads = []
+for captured in source:
+    payloads.append(cv2.imencode('.jpg', captured.image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes())
+    if len(payloads) >= args.frames:
+        break
+source.close()
+
+latencies = []
+batch_sizes = []
+errors = []
+lock = threading.Lock()
+
+
+def client(client_idx):
+    detector = RemoteDetector(args.server)
+    for i in range(args.requests):
+        t_start = time.perf_counter()
+        try:
+            response = detector.detect_encoded(payloads[(client_idx + i) % len(payloads)])
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+            continue
+        elapsed = time.perf_counter() - t_start
+        with lock:
+            if 'error' in response:
+                errors.append(response['error'])
+            else:
+                latencies.append(elapsed)
+                batch_sizes.append(response['batch_size'])
+    detector.close()
+
+
+threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+start = time.perf_counter()
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+elapsed = time.perf_counter() - start
+
+if not latencies:
+    print(f'All {len(errors)} requests failed: {errors[:1]}')
+    raise SystemExit(1)
+latencies = np.array(latencies) * 1000
+p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+print(f'clients: {args.clients}  requests: {len(latencies)}  errors: {len(errors)}')
+print(f'throughput: {len(latencies) / elapsed:.1f} frames/s  mean batch: {np.mean(batch_sizes):.2f}')
+print(f'latency ms  p50: {p50:.1f}  p95: {p95:.1f}  p99: {p99:.1f}  max: {latencies.max():.1f}')
@@ -0,0 +1,91 @@
+import time
+import argparse
+
+import numpy as np
+from ultralytics import YOLO
+
+from frame_sources import open_source
+from preprocess import Letterbox, parse_imgsz
+from detections import run_detector
+from telemetry import CsvTelemetry, SpeedScheduler
+
+# Replays recorded drives twice, once with inference on every frame and once
+# with the telemetry scheduler, and reports the CPU time saved and any sign
+# the scheduled run missed, e.g.
+#   python bench_telemetry.py --model my_model.pt --drive drive1.mp4 drive1.csv --drive drive2.mp4 drive2.csv
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--model', help='Path to YOLO model file (example: "my_model.pt")', required=True)
+parser.add_argument('--drive', help='Video file and telemetry CSV of one drive, can be repeated',
+                    nargs=2, action='append', metavar=('VIDEO', 'CSV'), required=True)
+parser.add_argument('--imgsz', help='Inference input size (default: 640)', default='640')
+parser.add_argument('--thresh', help='Confidence threshold for counting a sign (default: 0.5)', type=float, default=0.5)
+parser.add_argument('--gap', help='Seconds between sightings of a class that start a new sign (default: 1.0)',
+                    type=float, default=1.0)
+args = parser.parse_args()
+
+imgsz = parse_imgsz(args.imgsz)
+model = YOLO(args.model, task='detect')
+letterbox = Letterbox(imgsz)
+
+
+def replay(video, telemetry=None):
+    # Returns (sightings as (t, class id), frames, inferences, CPU seconds)
+    source = open_source(video)
+    scheduler = SpeedScheduler() if telemetry else None
+    sightings = []
+    cpu = 0.0
+    for captured in source:
+        t_start = time.process_time()
+        image = captured.infer_image
+        if scheduler is not None:
+            speed = telemetry.at(captured.timestamp).speed_kmh
+            if not scheduler.should_infer(captured.timestamp, speed):
+                cpu += time.process_time() - t_start
+                continue
+            x0, y0, x1, y1 = scheduler.roi(image.shape, speed)
+            image = image[y0:y1, x0:x1]
+        _, class_ids, confidences = run_detector(model, [letterbox], [image], imgsz)[0]
+        cpu += time.process_time() - t_start
+        sightings += [(captured.timestamp, int(c)) for c in class_ids[confidences > args.thresh]]
+    source.close()
+    inferences = scheduler.inferred if scheduler else source.frames_read
+    return sightings, source.frames_read, inferences, cpu
+
+
+def sign_events(sightings):
+    # Group sightings of the same class less than args.gap apart into one sign
+    events = []
+    for cls in sorted({c for _, c in sightings}):
+        times = np.sort([t for t, c in sightings if c == cls])
+        breaks = np.flatnonzero(np.diff(times) > args.gap)
+        for start, end in zip(np.r_[0, breaks + 1], np.r_[breaks, len(times) - 1]):
+            events.append((cls, times[start], times[end]))
+    return events
+
+
+totals = np.zeros(2)
+total_missed = 0
+for video, csv_path in args.drive:
+    full, frames, _, full_cpu = replay(video)
+    scheduled, _, inferences, scheduled_cpu = replay(video, CsvTelemetry(csv_path))
+    totals += (full_cpu, scheduled_cpu)
+
+    # A sign is missed if the scheduled run never saw its class while it was
+    # visible in the full run (with one scheduling interval of slack)
+    scheduled_times = {}
+    for t, c in scheduled:
+        scheduled_times.setdefault(c, []).append(t)
+    missed = [(c, t0, t1) for c, t0, t1 in sign_events(full)
+              if not any(t0 - 0.5 <= t <= t1 + 0.5 for t in scheduled_times.get(c, []))]
+    total_missed += len(missed)
+
+    saved = 1 - scheduled_cpu / full_cpu if full_cpu else 0.0
+    print(f'{video}: {frames} frames, inference on {inferences} ({inferences / max(1, frames):.0%}), '
+          f'CPU {full_cpu:.1f}s -> {scheduled_cpu:.1f}s (saved {saved:.0%}), '
+          f'signs {len(sign_events(full))}, missed {len(missed)}')
+    for c, t0, t1 in missed:
+        print(f'    missed {model.names[c]} at {t0:.1f}-{t1:.1f}s')
+
+saved = 1 - totals[1] / totals[0] if totals[0] else 0.0
+print(f'All drives: CPU saved {saved:.0%}, missed signs {total_missed}')
@@ -0,0 +1,89 @@
+import os
+import time
+import hashlib
+import sqlite3
+
+import numpy as np
+
+# Detections of one image packed into a single blob
+DETECTION_DTYPE = np.dtype([('box', '<f4', (4,)), ('cls', '<u2'), ('conf', '<f4')])
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DetectionCache:
+    # On-disk cache of detections keyed by image content hash. Entries are
+    # only valid for one model file (by content hash) and one set of inference
+    # parameters; entries of any other model are dropped when the cache is
+    # opened. The least recently used entries are evicted past max_entries.
+
+    def __init__(self, path, model_path, params='', max_entries=10000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.db = sqlite3.connect(path)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS detections (
+                key TEXT PRIMARY KEY, model TEXT NOT NULL, data BLOB NOT NULL, last_used REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS detections_last_used ON detections (last_used);
+            CREATE TABLE IF NOT EXISTS model_hashes (
+                path TEXT PRIMARY KEY, size INTEGER, mtime REAL, digest TEXT);
+        ''')
+        self.model = self._model_fingerprint(model_path)
+        self.params = str(params)
+        # Invalidate everything computed with another model file
+        self.db.execute('DELETE FROM detections WHERE model != ?', (self.model,))
+        self.db.commit()
+
+    def _model_fingerprint(self, model_path):
+        # Hashing a model file takes a moment, so remember the hash for an
+        # unchanged size and modification time
+        stat = os.stat(model_path)
+        path = os.path.abspath(model_path)
+        row = self.db.execute('SELECT size, mtime, digest FROM model_hashes WHERE path = ?', (path,)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime:
+            return row[2]
+        digest = file_digest(model_path)
+        self.db.execute('INSERT OR REPLACE INTO model_hashes VALUES (?, ?, ?, ?)',
+                        (path, stat.st_size, stat.st_mtime, digest))
+        return digest
+
+    def key_for_file(self, image_path):
+        return hashlib.sha1(f'{file_digest(image_path)}|{self.model}|{self.params}'.encode()).hexdigest()
+
+    def get(self, key):
+        # Returns (boxes, class_ids, confidences) or None
+        row = self.db.execute('SELECT data FROM detections WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.db.execute('UPDATE detections SET last_used = ? WHERE key = ?', (time.time(), key))
+        records = np.frombuffer(row[0], dtype=DETECTION_DTYPE)
+        return records['box'].copy(), records['cls'].astype(int), records['conf'].copy()
+
+    def put(self, key, boxes, class_ids, confidences):
+        records = np.empty(len(class_ids), dtype=DETECTION_DTYPE)
+        records['box'] = np.asarray(boxes).reshape(-1, 4)
+        records['cls'] = class_ids
+        records['conf'] = confidences
+        self.db.execute('INSERT OR REPLACE INTO detections VALUES (?, ?, ?, ?)',
+                        (key, self.model, records.tobytes(), time.time()))
+        self._evict()
+        self.db.commit()
+
+    def _evict(self):
+        count, = self.db.execute('SELECT COUNT(*) FROM detections').fetchone()
+        if count > self.max_entries:
+            self.db.execute('DELETE FROM detections WHERE key IN '
+                            '(SELECT key FROM detections ORDER BY last_used LIMIT ?)', (count - self.max_entries,))
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
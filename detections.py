@@ -0,0 +1,35 @@
+import numpy as np
+
+
+def run_detector(model, letterboxes, images, imgsz):
+    # Run the model on one or more images as a single batch. Each image uses
+    # its own Letterbox so boxes come back in that image's coordinates.
+    # Returns a list of (boxes, class_ids, confidences) per image.
+    inputs = [letterbox(image) for letterbox, image in zip(letterboxes, images)]
+    results = model(inputs if len(inputs) > 1 else inputs[0], imgsz=(imgsz[1], imgsz[0]), verbose=False)
+    outputs = []
+    for letterbox, result in zip(letterboxes, results):
+        boxes = result.boxes
+        outputs.append((letterbox.unmap(boxes.xyxy.cpu().numpy()),
+                        boxes.cls.cpu().numpy().astype(int),
+                        boxes.conf.cpu().numpy()))
+    return outputs
+
+
+def to_records(labels, boxes, class_ids, confidences, thresh=0.5):
+    # Detection records as printed by the CLI and returned by the inference server
+    records = []
+    for box, class_id, conf in zip(boxes, class_ids, confidences):
+        if conf > thresh:
+            xmin, ymin, xmax, ymax = (int(v) for v in box)
+            records.append({'class': labels[int(class_id)], 'class_id': int(class_id),
+                            'confidence': round(float(conf), 4), 'box': [xmin, ymin, xmax, ymax]})
+    return records
+
+
+def from_records(records):
+    # Inverse of to_records, for clients that draw like the CLI does
+    boxes = np.array([r['box'] for r in records], dtype=np.float32).reshape(-1, 4)
+    class_ids = np.array([r['class_id'] for r in records], dtype=int)
+    confidences = np.array([r['confidence'] for r in records], dtype=np.float32)
+    return boxes, class_ids, confidences
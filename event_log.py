@@ -0,0 +1,157 @@
+import os
+import sys
+import json
+import glob
+import time
+import struct
+import argparse
+import threading
+
+import numpy as np
+
+# Each drive is one append-only file: a magic line, a length-prefixed JSON
+# header (class names, start time) and then fixed-size binary records. The
+# record is packed without padding, 25 bytes each (RECORD_DTYPE.itemsize).
+MAGIC = b'SIGNLOG1\n'
+RECORD_DTYPE = np.dtype([
+    ('t', '<f8'),         # Frame timestamp in seconds
+    ('frame', '<u4'),     # Frame index
+    ('kind', 'u1'),       # KIND_DETECTION, KIND_ALERT or KIND_QOS
+    ('cls', '<u2'),       # Class id from model.names, or the QoS level index
+    ('conf', '<f2'),      # Confidence
+    ('box', '<i2', (4,)), # xmin, ymin, xmax, ymax in display coordinates
+])
+KIND_DETECTION = 0
+KIND_ALERT = 1
+KIND_QOS = 2
+
+# off: nothing, alerts: only boxes that fired a notification, all: every box
+LOG_LEVELS = ['off', 'alerts', 'all']
+
+
+class DetectionLogger:
+    # Buffers detection records in memory and appends them to the log file in
+    # batches from a background thread, so the frame loop never does I/O
+
+    def __init__(self, log_dir='logs', labels=None, level='alerts', flush_interval=1.0):
+        self.level = level
+        self.flush_interval = flush_interval
+        self.path = None
+        self._pending = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        if level == 'off':
+            return
+
+        os.makedirs(log_dir, exist_ok=True)
+        start = time.time()
+        self.path = os.path.join(log_dir, time.strftime('drive-%Y%m%d-%H%M%S', time.localtime(start)) + f'-{os.getpid()}.sdl')
+        header = json.dumps({'start': start, 'labels': dict(labels or {})}).encode()
+        with open(self.path, 'ab') as f:
+            f.write(MAGIC + struct.pack('<I', len(header)) + header)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def log(self, t, frame_idx, class_ids, confs, boxes, kind=KIND_DETECTION):
+        # Log a batch of boxes from one frame. Arrays are copied into a single
+        # record array here, everything else happens on the writer thread.
+        if self.level == 'off' or (kind == KIND_DETECTION and self.level != 'all'):
+            return
+        n = len(class_ids)
+        if n == 0:
+            return
+        records = np.empty(n, dtype=RECORD_DTYPE)
+        records['t'] = t
+        records['frame'] = frame_idx
+        records['kind'] = kind
+        records['cls'] = class_ids
+        records['conf'] = confs
+        records['box'] = np.clip(np.asarray(boxes).reshape(n, 4), -32768, 32767)
+        with self._lock:
+            self._pending.append(records)
+
+    def log_alert(self, t, frame_idx, class_id, conf, box):
+        self.log(t, frame_idx, [class_id], [conf], [box], kind=KIND_ALERT)
+
+    def log_qos(self, t, frame_idx, level):
+        # Record a quality-of-service level change
+        self.log(t, frame_idx, [level], [0], [(0, 0, 0, 0)], kind=KIND_QOS)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if pending and self.path:
+            with open(self.path, 'ab') as f:
+                f.write(np.concatenate(pending).tobytes())
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+def read_log(path):
+    # Return (header dict, record array). A partially written last record,
+    # e.g. after a power cut, is ignored.
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f'{path} is not a detection log')
+    offset = len(MAGIC)
+    header_len, = struct.unpack_from('<I', data, offset)
+    offset += 4
+    header = json.loads(data[offset:offset+header_len])
+    offset += header_len
+    count = (len(data) - offset) // RECORD_DTYPE.itemsize
+    records = np.frombuffer(data, dtype=RECORD_DTYPE, count=count, offset=offset)
+    return header, records
+
+
+def summarize(path):
+    header, records = read_log(path)
+    labels = {int(k): v for k, v in header['labels'].items()}
+    summary = {
+        'drive': os.path.basename(path),
+        'start': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(header['start'])),
+        'duration_s': float(records['t'].max() - records['t'].min()) if len(records) else 0.0,
+        'qos_changes': int(np.count_nonzero(records['kind'] == KIND_QOS)),
+        'signs': {},
+    }
+    for kind, key in ((KIND_ALERT, 'alerts'), (KIND_DETECTION, 'detections')):
+        classes, counts = np.unique(records['cls'][records['kind'] == kind], return_counts=True)
+        for cls, count in zip(classes, counts):
+            name = labels.get(int(cls), str(cls))
+            summary['signs'].setdefault(name, {'alerts': 0, 'detections': 0})[key] = int(count)
+    return summary
+
+
+if __name__ == '__main__':
+    # Summarize sign counts per drive, e.g. "python event_log.py logs"
+    parser = argparse.ArgumentParser(description='Summarize detection logs written by DetectionLogger')
+    parser.add_argument('paths', nargs='+', help='Log files or directories of .sdl files')
+    parser.add_argument('--json', help='Print the summaries as JSON', action='store_true')
+    args = parser.parse_args()
+
+    files = []
+    for path in args.paths:
+        files += sorted(glob.glob(os.path.join(path, '*.sdl'))) if os.path.isdir(path) else [path]
+    if not files:
+        print('No detection logs found.')
+        sys.exit(0)
+
+    summaries = [summarize(path) for path in files]
+    if args.json:
+        print(json.dumps(summaries, indent=2))
+        sys.exit(0)
+    for summary in summaries:
+        print(f"{summary['drive']}  started {summary['start']}  ({summary['duration_s']:.0f}s, "
+              f"{summary['qos_changes']} QoS changes)")
+        for name, counts in sorted(summary['signs'].items()):
+            print(f"    {name:<30} alerts: {counts['alerts']:<6} detections: {counts['detections']}")
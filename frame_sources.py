@@ -0,0 +1,400 @@
+import os
+import glob
+import time
+import threading
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from tuning import pin_thread
+
+IMG_EXT_LIST = ['.jpg','.JPG','.jpeg','.JPEG','.png','.PNG','.bmp','.BMP']
+VID_EXT_LIST = ['.avi','.mov','.mp4','.mkv','.wmv']
+
+# A captured frame. infer_image is the image to run inference on, which is
+# the display image itself unless the source provides a separate stream.
+Frame = namedtuple('Frame', ['image', 'infer_image', 'timestamp', 'index'])
+
+
+def fit_size(size, bound):
+    # Scale a (w, h) size down to fit inside bound (w, h), keeping the aspect
+    # ratio and even dimensions as required by the camera ISP
+    w, h = size
+    scale = min(bound[0] / w, bound[1] / h, 1.0)
+    return (max(2, int(w * scale) // 2 * 2), max(2, int(h * scale) // 2 * 2))
+
+
+class FrameSource:
+    # Common interface for every image source. read() returns the next Frame,
+    # or None once the source is exhausted or the device stops delivering.
+    source_type = None
+    live = False  # Live sources keep producing frames whether or not they are read
+    reuses_buffers = False  # Images are overwritten by the next read
+    end_message = 'Source has no more frames. Exiting program.'
+
+    def __init__(self):
+        self.frames_read = 0
+        self.frames_dropped = 0
+
+    def _frame(self, image, infer_image=None, timestamp=None):
+        frame = Frame(image, image if infer_image is None else infer_image,
+                      time.time() if timestamp is None else timestamp, self.frames_read)
+        self.frames_read += 1
+        return frame
+
+    def read(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __iter__(self):
+        while True:
+            frame = self.read()
+            if frame is None:
+                return
+            yield frame
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ImageSource(FrameSource):
+    # Single image or a folder of images, read one file per frame
+    source_type = 'image'
+    end_message = 'All images have been processed. Exiting program.'
+
+    def __init__(self, paths, source_type='image'):
+        super().__init__()
+        self.paths = list(paths)
+        self.source_type = source_type
+        self.current_path = None  # File of the frame returned by the last read
+
+    def read(self):
+        while self.frames_read < len(self.paths):
+            self.current_path = self.paths[self.frames_read]
+            image = cv2.imread(self.current_path)
+            if image is not None:
+                return self._frame(image)
+            self.frames_read += 1
+            self.frames_dropped += 1
+        return None
+
+
+class VideoSource(FrameSource):
+    source_type = 'video'
+    end_message = 'Reached end of the video file. Exiting program.'
+
+    def __init__(self, path):
+        super().__init__()
+        self.cap = cv2.VideoCapture(path)
+
+    def read(self):
+        ret, image = self.cap.read()
+        if not ret or image is None:
+            return None
+        # Use the position in the file so timestamps are reproducible
+        return self._frame(image, timestamp=self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000)
+
+    def close(self):
+        self.cap.release()
+
+
+class CameraSource(FrameSource):
+    source_type = 'usb'
+    live = True
+    end_message = 'Unable to read frames from the camera. This indicates the camera is disconnected or not working. Exiting program.'
+
+    def __init__(self, index=0, resolution=None):
+        super().__init__()
+        self.cap = cv2.VideoCapture(index)
+
+        # Set camera resolution if specified by user
+        if resolution:
+            resW, resH = resolution
+            # Get the camera's native resolution
+            native_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            native_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+            # Only set resolution if it's different from native
+            if resW != native_width or resH != native_height:
+                self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, resW)
+                self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, resH)
+                # Set zoom to 1.0 (normal)
+                self.cap.set(cv2.CAP_PROP_ZOOM, 1.0)
+                # Set focus to auto
+                self.cap.set(cv2.CAP_PROP_AUTOFOCUS, 1)
+
+    def is_opened(self):
+        return self.cap.isOpened()
+
+    def read(self):
+        ret, image = self.cap.read()
+        if not ret or image is None:
+            return None
+        return self._frame(image)
+
+    def close(self):
+        self.cap.release()
+
+
+class StreamSource(CameraSource):
+    # Network stream (RTSP/HTTP via FFmpeg) or a raw GStreamer pipeline
+    source_type = 'stream'
+    end_message = 'Stream stopped delivering frames. Exiting program.'
+
+    def __init__(self, url, gstreamer=False):
+        FrameSource.__init__(self)
+        backend = cv2.CAP_GSTREAMER if gstreamer else cv2.CAP_FFMPEG
+        self.cap = cv2.VideoCapture(url, backend)
+        # Keep the driver queue short so reads return recent frames
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+
+class PicameraSource(FrameSource):
+    # Picamera2 capture with a full-size main stream for display and a
+    # low-resolution YUV420 stream for inference. Frames are read straight out
+    # of the camera buffers into arrays that are reused between reads.
+    #
+    # provider is the module exposing Picamera2 and MappedArray, which lets the
+    # source run against a mock camera on machines without libcamera.
+    source_type = 'picamera'
+    live = True
+    reuses_buffers = True
+    end_message = 'Unable to read frames from the Picamera. This indicates the camera is disconnected or not working. Exiting program.'
+
+    def __init__(self, index=0, size=(640, 480), lores_size=None, buffer_count=4, provider=None):
+        super().__init__()
+        if provider is None:
+            import picamera2 as provider
+        self.provider = provider
+        self.size = tuple(size)
+        self.lores_size = tuple(lores_size) if lores_size else None
+
+        self.camera = provider.Picamera2(index)
+        streams = {'main': {'format': 'RGB888', 'size': self.size}, 'buffer_count': buffer_count}
+        if self.lores_size:
+            streams['lores'] = {'format': 'YUV420', 'size': self.lores_size}
+        self.camera.configure(self.camera.create_video_configuration(**streams))
+        self.camera.start()
+
+        self.main_buffer = None
+        self.lores_buffer = None
+
+    def _copy_main(self, request):
+        with self.provider.MappedArray(request, 'main') as mapped:
+            array = mapped.array
+            if array.ndim == 3 and array.shape[2] == 4:
+                array = array[:, :, :3]
+            if self.main_buffer is None or self.main_buffer.shape != array.shape:
+                self.main_buffer = np.empty(array.shape, dtype=np.uint8)
+            np.copyto(self.main_buffer, array)
+        return self.main_buffer
+
+    def _convert_lores(self, request):
+        # The YUV420 plane is (h * 3/2, stride), convert it directly into the
+        # reused BGR buffer and crop away the stride padding with a view
+        lores_w, lores_h = self.lores_size
+        with self.provider.MappedArray(request, 'lores') as mapped:
+            yuv = mapped.array
+            shape = (yuv.shape[0] * 2 // 3, yuv.shape[1], 3)
+            if self.lores_buffer is None or self.lores_buffer.shape != shape:
+                self.lores_buffer = np.empty(shape, dtype=np.uint8)
+            cv2.cvtColor(yuv, cv2.COLOR_YUV2BGR_I420, dst=self.lores_buffer)
+        return self.lores_buffer[:lores_h, :lores_w]
+
+    def read(self):
+        # Both arrays of the returned frame are overwritten by the next read
+        request = self.camera.capture_request()
+        if request is None:
+            return None
+        try:
+            image = self._copy_main(request)
+            infer_image = self._convert_lores(request) if self.lores_size else None
+        finally:
+            request.release()
+        return self._frame(image, infer_image)
+
+    def close(self):
+        self.camera.stop()
+        self.camera.close()
+
+
+class SyntheticSource(FrameSource):
+    # Deterministic source for tests and benchmarks. Replays a folder of
+    # images (or generated frames when no folder is given) with timestamps
+    # advancing exactly 1/fps per frame. With realtime=True reads are paced
+    # to the wall clock, otherwise they return as fast as they are consumed.
+    source_type = 'synthetic'
+    end_message = 'Synthetic source finished. Exiting program.'
+
+    def __init__(self, folder=None, fps=30, count=None, size=(640, 480), realtime=False, seed=0):
+        super().__init__()
+        self.fps = float(fps)
+        self.count = count
+        self.realtime = realtime
+        self.start_time = None
+        if folder:
+            paths = sorted(p for p in glob.glob(os.path.join(folder, '*'))
+                           if os.path.splitext(p)[1] in IMG_EXT_LIST)
+            self.images = [cv2.imread(p) for p in paths]
+            self.images = [img for img in self.images if img is not None]
+            if not self.images:
+                raise ValueError(f'No images found in {folder}')
+        else:
+            self.images = self._generate(size, seed)
+
+    @staticmethod
+    def _generate(size, seed, n=30):
+        # Grey road scenes with red, blue and yellow shapes drifting across
+        rng = np.random.default_rng(seed)
+        w, h = size
+        images = []
+        for i in range(n):
+            image = np.full((h, w, 3), 90, dtype=np.uint8)
+            image[h // 2:] = 60
+            x = int((i / n) * w * 0.8) + w // 10
+            y = h // 3 + int(rng.integers(-10, 10))
+            r = max(8, min(w, h) // 12)
+            cv2.circle(image, (x, y), r, (0, 0, 220), -1)
+            cv2.circle(image, (x, y), int(r * 0.7), (255, 255, 255), -1)
+            cv2.rectangle(image, (w - x - r, y - r), (w - x + r, y + r), (200, 80, 0), -1)
+            cv2.fillPoly(image, [np.array([[x, h - 40 - 2 * r], [x - r, h - 40], [x + r, h - 40]])], (0, 210, 230))
+            images.append(image)
+        return images
+
+    def read(self):
+        if self.count is not None and self.frames_read >= self.count:
+            return None
+        timestamp = self.frames_read / self.fps
+        if self.realtime:
+            if self.start_time is None:
+                self.start_time = time.perf_counter()
+            delay = self.start_time + timestamp - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        image = self.images[self.frames_read % len(self.images)]
+        return self._frame(image, timestamp=timestamp)
+
+
+class ThreadedSource(FrameSource):
+    # Reads a source on a background thread. For live sources only the newest
+    # frame is kept, so a slow consumer never backs up a camera; frames
+    # overwritten before they were read are counted in frames_dropped. File
+    # and synthetic sources hand over every frame and read ahead by one, so
+    # they play at the consumer's pace. The reader thread is pinned to cores
+    # if given. finished is set at the end of the source or when reading it
+    # fails, end_message then says which.
+
+    def __init__(self, source, cores=None):
+        super().__init__()
+        self.source = source
+        self.cores = cores
+        self.source_type = source.source_type
+        self.live = source.live
+        self.end_message = source.end_message
+        self.finished = False
+        self._latest = None
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        pin_thread(self.cores)
+        try:
+            while not self._stop.is_set():
+                frame = self.source.read()
+                if frame is None:
+                    break
+                if self.source.reuses_buffers:
+                    # Detach from buffers the source is about to overwrite
+                    image = frame.image.copy()
+                    infer_image = image if frame.infer_image is frame.image else frame.infer_image.copy()
+                    frame = frame._replace(image=image, infer_image=infer_image)
+                with self._condition:
+                    if not self.live:
+                        # Wait until the previous frame was taken
+                        self._condition.wait_for(lambda: self._latest is None or self._stop.is_set())
+                    if self._latest is not None:
+                        self.frames_dropped += 1
+                    self._latest = frame
+                    self._condition.notify_all()
+        except Exception as e:
+            self.end_message = f'Reading the source failed: {e}'
+        finally:
+            with self._condition:
+                self.finished = True
+                self._condition.notify_all()
+
+    def poll(self):
+        # Non-blocking read, None when no new frame is ready (check finished)
+        with self._condition:
+            frame, self._latest = self._latest, None
+            self._condition.notify_all()
+        if frame is not None:
+            self.frames_read += 1
+        return frame
+
+    def read(self, timeout=None):
+        with self._condition:
+            self._condition.wait_for(lambda: self._latest is not None or self.finished, timeout)
+        return self.poll()
+
+    def close(self):
+        self._stop.set()
+        with self._condition:
+            self._condition.notify_all()
+        self._thread.join(timeout=1)
+        self.source.close()
+
+
+# Backends selected by a "name:" prefix in the source string. Register extra
+# backends here, the factory is called with the text after the prefix and
+# the keyword arguments given to open_source.
+BACKENDS = {}
+
+
+def register_backend(name, factory):
+    BACKENDS[name] = factory
+
+
+def _open_synthetic(spec, resolution=None, **kwargs):
+    # synthetic[:FOLDER][@FPS], e.g. "synthetic@15" or "synthetic:test_dir@10"
+    spec, _, fps = spec.partition('@')
+    return SyntheticSource(folder=spec or None, fps=float(fps or 30), size=resolution or (640, 480))
+
+
+register_backend('synthetic', _open_synthetic)
+register_backend('gst', lambda spec, **kwargs: StreamSource(spec, gstreamer=True))
+
+
+def open_source(spec, resolution=None, imgsz=None, **kwargs):
+    # Parse a source string and return the matching FrameSource. Raises
+    # ValueError with a user-facing message when the input is invalid.
+    name = spec.split(':', 1)[0].split('@', 1)[0]
+    if name in BACKENDS:
+        return BACKENDS[name](spec[len(name):].lstrip(':'), resolution=resolution, imgsz=imgsz, **kwargs)
+    if spec.startswith(('rtsp://', 'rtmp://', 'http://', 'https://')):
+        return StreamSource(spec)
+    if os.path.isdir(spec):
+        paths = [p for p in glob.glob(spec + '/*') if os.path.splitext(p)[1] in IMG_EXT_LIST]
+        return ImageSource(paths, source_type='folder')
+    if os.path.isfile(spec):
+        _, ext = os.path.splitext(spec)
+        if ext in IMG_EXT_LIST:
+            return ImageSource([spec])
+        if ext in VID_EXT_LIST:
+            return VideoSource(spec)
+        raise ValueError(f'File extension {ext} is not supported.')
+    if 'usb' in spec:
+        return CameraSource(int(spec[3:]), resolution)
+    if 'picamera' in spec:
+        # Display from the main stream, run inference on a lores stream sized to fit the model input
+        size = resolution or (640, 480)
+        return PicameraSource(int(spec[8:]), size, lores_size=fit_size(size, imgsz) if imgsz else None)
+    raise ValueError(f'Input {spec} is invalid. Please try again.')
@@ -6,21 +6,41 @@ from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                             QComboBox, QFrame)
 from PyQt6.QtCore import Qt, QTimer
 from PyQt6.QtGui import QImage, QPixmap
-import threading
 from ultralytics import YOLO
-import pyttsx3
+
+from preprocess import Letterbox, scale_boxes
+from frame_sources import ThreadedSource, open_source
+from detections import run_detector
+from thumbnails import SignCropCache
+from event_log import DetectionLogger
+from stream_server import start_stream_server
+from profiling import NullProfiler, SlowFrameProfiler
+from tuning import MAIN_STAGES, TUNING_FILE, apply_tuning, describe, load_tuning
+from sign_state import SignStateTable
+from alert_bus import AlertBus, FileSink, MqttSink, OverlaySink, SignEvent, TtsSink, WebhookSink
 
 # Define important signs that should trigger reminders
 IMPORTANT_SIGNS = ['max speed 100km/h', 'caution accident area']
 
-def speak_sign(text):
-    engine = pyttsx3.init()
-    engine.setProperty('rate', 150)
-    engine.say(text)
-    engine.runAndWait()
+# Detections written to the drive log in logs/: "alerts", "all" or "off"
+DETECTION_LOG_LEVEL = 'alerts'
+
+# Port to serve the annotated camera feed on as MJPEG (e.g. 8080), None to disable
+STREAM_PORT = None
+
+# Profile frames slower than this many milliseconds into profiles/, None to disable
+PROFILE_BUDGET_MS = None
+
+# Time alert cooldowns and reminders on the "wall" clock or on "frame" timestamps (for replays and soak tests)
+CLOCK = 'wall'
+
+# Extra alert sinks: JSON lines file, MQTT broker "host[:port]" and webhook URL, None to disable
+ALERT_FILE = None
+MQTT_BROKER = None
+WEBHOOK_URL = None
 
 class TrafficSignApp(QMainWindow):
-    def __init__(self):
+    def __init__(self, source_spec="usb0"):
         super().__init__()
         self.setWindowTitle("Traffic Sign Detection")
         
@@ -34,6 +54,9 @@ class TrafficSignApp(QMainWindow):
         # Initialize variables
         self.model = None
         self.cap = None
+        self.event_logger = None
+        self.sign_state = None
+        self.source_spec = source_spec
         self.current_notification = None
         self.current_sign_image = None
         self.reminder_notification = None
@@ -42,11 +65,34 @@ class TrafficSignApp(QMainWindow):
         self.enable_audio = True
         self.enable_reminder = True
         self.reminder_interval = 15
-        self.reminder_scheduled = set()
-        self.last_notification_time = 0
         self.notification_duration = 3
         self.reminder_display_duration = 5
         self.reminder_start_time = 0
+        self.imgsz = (640, 640)  # Inference input size (matches training imgsz)
+        self.letterbox = Letterbox(self.imgsz)
+        self.sign_cache = SignCropCache()
+        self.broadcaster = None
+        if STREAM_PORT:
+            self.broadcaster, self.stream_server = start_stream_server(STREAM_PORT)
+        self.profiler = SlowFrameProfiler(PROFILE_BUDGET_MS) if PROFILE_BUDGET_MS else NullProfiler()
+        self.thumbnail_size = (80, 80)
+
+        # Fan alerts out to the panels, speech and any remote sinks, each on
+        # its own bounded queue so none of them can hold up a frame
+        self.now = time.time()  # Current time on CLOCK, set every update
+        self.alert_bus = AlertBus(clock=lambda: self.now)
+        self.overlay_sink = self.alert_bus.add(OverlaySink())
+        self.tts_sink = self.alert_bus.add(TtsSink())
+        if ALERT_FILE:
+            self.alert_bus.add(FileSink(ALERT_FILE))
+        if MQTT_BROKER:
+            host, _, port = MQTT_BROKER.partition(':')
+            try:
+                self.alert_bus.add(MqttSink(host, int(port or 1883)))
+            except ValueError as e:
+                print(f"Error: {e}")
+        if WEBHOOK_URL:
+            self.alert_bus.add(WebhookSink(WEBHOOK_URL))
         
         # Create main widget and layout
         main_widget = QWidget()
@@ -377,6 +423,13 @@ class TrafficSignApp(QMainWindow):
         layout.addWidget(left_panel, stretch=7)
         layout.addWidget(right_panel, stretch=3)
 
+        # Apply the thread counts and core pinning found by autotune.py, the
+        # Qt thread runs inference and rendering, the capture thread its own cores
+        self.tuning = load_tuning(TUNING_FILE)
+        if self.tuning is not None:
+            apply_tuning(self.tuning, MAIN_STAGES)
+            print(f"Using {TUNING_FILE}: {describe(self.tuning)}")
+
         # Initialize camera and model
         self.init_camera()
         self.init_model()
@@ -387,39 +440,70 @@ class TrafficSignApp(QMainWindow):
         self.timer.start(30)  # Update every 30ms
 
     def init_camera(self):
-        self.cap = cv2.VideoCapture(0)
-        if not self.cap.isOpened():
+        try:
+            source = open_source(self.source_spec, imgsz=self.imgsz)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit()
+        if hasattr(source, "is_opened") and not source.is_opened():
             print("Error: Could not open camera")
             sys.exit()
-        print("Camera initialized on device 0")
+        # Capture on a background thread so the Qt timer never waits on the device
+        self.cap = ThreadedSource(source, cores=self.tuning['capture_cores'] if self.tuning else None)
+        print(f"Camera initialized on {self.source_spec}")
 
     def init_model(self):
         try:
             self.model = YOLO("my_model.pt", task='detect')
             print("Model loaded successfully: my_model.pt")
+            self.event_logger = DetectionLogger('logs', self.model.names, level=DETECTION_LOG_LEVEL)
+            # A sign alerts once seen in 3 of the last 5 frames, the same sign
+            # not again while its notification is up
+            self.sign_state = SignStateTable(self.model.names, k=3, n=5, cooldown=self.notification_duration,
+                                             important=IMPORTANT_SIGNS)
         except Exception as e:
             print(f"Error loading model: {e}")
             sys.exit()
 
     def update_frame(self):
-        ret, frame = self.cap.read()
-        if ret:
-            # Run detection
-            results = self.model(frame, verbose=False)
-            detections = results[0].boxes
+        captured = self.cap.poll()
+        if CLOCK != 'frame':
+            self.now = time.time()
+        elif captured is not None:
+            self.now = captured.timestamp
+        self.alert_bus.tick()
+        self.show_alert_events()
+        if captured is None and self.cap.finished:
+            self.timer.stop()
+            print(self.cap.end_message)
+        if captured is not None:
+            self.profiler.begin_frame()
+            frame = captured.image.copy()
+            self.profiler.mark('capture')
+
+            # Run detection on the letterboxed frame, the same way as yolo_detect.py
+            boxes_xyxy, class_ids, confidences = run_detector(self.model, [self.letterbox],
+                                                              [captured.infer_image], self.imgsz)[0]
+            boxes_xyxy = scale_boxes(boxes_xyxy, captured.infer_image.shape, frame.shape)
+            shown = confidences > 0.5
+            self.event_logger.log(captured.timestamp, captured.index,
+                                  class_ids[shown], confidences[shown], boxes_xyxy[shown])
+            self.profiler.mark('inference')
 
             # Process detections
-            for detection in detections:
+            for i in range(len(class_ids)):
                 # Get bounding box coordinates
-                xyxy = detection.xyxy.cpu().numpy().squeeze()
-                xmin, ymin, xmax, ymax = map(int, xyxy)
+                xmin, ymin, xmax, ymax = boxes_xyxy[i].astype(int)
 
                 # Get class and confidence
-                class_idx = int(detection.cls.item())
+                class_idx = int(class_ids[i])
                 class_name = self.model.names[class_idx]
-                conf = detection.conf.item()
+                conf = float(confidences[i])
 
                 if conf > 0.5:
+                    # Keep the sign region if it is the best one seen for this class
+                    self.sign_cache.offer(class_name, captured.image, (xmin, ymin, xmax, ymax), conf, self.now)
+
                     # Draw bounding box
                     cv2.rectangle(frame, (xmin, ymin), (xmax, ymax), (0, 255, 0), 2)
                     
@@ -428,10 +512,14 @@ class TrafficSignApp(QMainWindow):
                     cv2.putText(frame, label, (xmin, ymin-10), 
                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
 
-                    # Handle notifications and reminders
-                    self.handle_detection(class_name, frame[ymin:ymax, xmin:xmax])
+            # Update every class's state in one step, only newly confirmed signs alert
+            for class_idx in self.sign_state.update(class_ids, confidences, boxes_xyxy, self.now):
+                self.handle_detection(int(class_idx), captured)
+            self.profiler.mark('draw')
 
             # Convert frame to QImage and display
+            if self.broadcaster:
+                self.broadcaster.publish(frame)
             rgb_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
             h, w, ch = rgb_image.shape
             bytes_per_line = ch * w
@@ -445,53 +533,55 @@ class TrafficSignApp(QMainWindow):
                 Qt.TransformationMode.SmoothTransformation
             )
             self.camera_label.setPixmap(scaled_pixmap)
+            self.profiler.mark('display')
+            self.profiler.end_frame(frame=captured.index, timestamp=captured.timestamp,
+                                    detections=int(shown.sum()))
 
-    def handle_detection(self, class_name, sign_image):
-        current_time = time.time()
-        
-        # Print detection information
-        print(f"Detected: {class_name} at (x: {int(sign_image.shape[1]/2)}, y: {int(sign_image.shape[0]/2)})")
-        
-        # Handle audio independently of notifications
-        if self.enable_audio and current_time - self.last_notification_time > self.notification_duration:
-            threading.Thread(target=speak_sign, args=(class_name,), daemon=True).start()
-        
-        # Handle notification
-        if self.show_notification and current_time - self.last_notification_time > self.notification_duration:
-            try:
-                # Convert BGR to RGB for proper display
-                sign_image_rgb = cv2.cvtColor(sign_image, cv2.COLOR_BGR2RGB)
-                self.current_notification = class_name
-                self.current_sign_image = sign_image_rgb
-                self.last_notification_time = current_time
+    def handle_detection(self, class_idx, captured):
+        try:
+            class_name = self.model.names[class_idx]
+            conf = float(self.sign_state.confidence[class_idx])
+            box = tuple(int(v) for v in self.sign_state.boxes[class_idx])
+            # Build the RGB thumbnail only now that the notification fires
+            sign_image_rgb = self.sign_cache.thumbnail(class_name, self.thumbnail_size, cv2.COLOR_BGR2RGB)
+            self.event_logger.log_alert(captured.timestamp, captured.index, class_idx, conf, box)
+            event = SignEvent('alert', class_name, class_idx, conf, box,
+                              captured.timestamp, captured.index, sign_image_rgb, time.time())
+            self.alert_bus.publish(event)
+
+            # Handle reminder for important signs, unless one is already pending
+            if self.enable_reminder and self.sign_state.important[class_idx]:
+                if self.alert_bus.schedule(event._replace(kind='reminder'), self.reminder_interval):
+                    print(f"Reminder set for: {self.reminder_interval} seconds")
+        except Exception as e:
+            print(f"Error handling detection: {e}")
+
+    def show_alert_events(self):
+        # Runs on the Qt thread, so the panels can be updated directly
+        for event in self.overlay_sink.poll():
+            if event.kind == 'alert':
+                self.current_notification = event.name
+                self.current_sign_image = event.thumbnail
                 self.show_notification_panel()
-                print(f"Notification shown for: {class_name}")
-                
-                # Handle reminder for important signs
-                if self.enable_reminder and class_name in IMPORTANT_SIGNS:
-                    if class_name not in self.reminder_scheduled:
-                        self.reminder_scheduled.add(class_name)
-                        print(f"Reminder set for: {self.reminder_interval} seconds")
-                        threading.Thread(target=self.schedule_reminder, 
-                                       args=(class_name, sign_image_rgb.copy()), daemon=True).start()
-            except Exception as e:
-                print(f"Error handling detection: {e}")
+                if self.show_notification:
+                    print(f"Notification shown for: {event.name}")
+            elif self.enable_reminder:
+                self.reminder_notification = event.name
+                self.reminder_sign_image = event.thumbnail
+                self.reminder_start_time = self.now
+                self.show_reminder_panel()
 
     def show_notification_panel(self):
         try:
             if self.current_notification and self.current_sign_image is not None and self.show_notification:
                 self.notification_label.setText(self.current_notification)
                 
-                # Convert sign image to QPixmap and display
+                # Convert sign thumbnail to QPixmap and display
                 h, w, ch = self.current_sign_image.shape
                 bytes_per_line = ch * w
                 qt_image = QImage(self.current_sign_image.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
-                pixmap = QPixmap.fromImage(qt_image).scaled(
-                    80, 80,
-                    Qt.AspectRatioMode.KeepAspectRatio,
-                    Qt.TransformationMode.SmoothTransformation
-                )
-                self.notification_image.setPixmap(pixmap)
+                # The cached thumbnail already fits the 80x80 label
+                self.notification_image.setPixmap(QPixmap.fromImage(qt_image))
                 
                 self.overlay.show()
                 self.notification_panel.show()
@@ -511,34 +601,17 @@ class TrafficSignApp(QMainWindow):
         if not self.reminder_panel.isVisible():
             self.overlay.hide()
 
-    def schedule_reminder(self, sign_name, sign_image):
-        try:
-            time.sleep(self.reminder_interval)
-            if sign_name in self.reminder_scheduled and self.enable_reminder:  # Check if reminders are still enabled
-                self.reminder_notification = sign_name
-                self.reminder_sign_image = sign_image
-                self.reminder_start_time = time.time()
-                self.reminder_scheduled.remove(sign_name)
-                # Use QTimer to ensure GUI updates happen in the main thread
-                QTimer.singleShot(0, self.show_reminder_panel)
-        except Exception as e:
-            print(f"Error scheduling reminder: {e}")
-
     def show_reminder_panel(self):
         try:
             if self.reminder_notification and self.reminder_sign_image is not None and self.enable_reminder:
                 self.reminder_label.setText(f"Reminder: {self.reminder_notification}")
                 
-                # Convert sign image to QPixmap and display
+                # Convert sign thumbnail to QPixmap and display
                 h, w, ch = self.reminder_sign_image.shape
                 bytes_per_line = ch * w
                 qt_image = QImage(self.reminder_sign_image.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
-                pixmap = QPixmap.fromImage(qt_image).scaled(
-                    80, 80,
-                    Qt.AspectRatioMode.KeepAspectRatio,
-                    Qt.TransformationMode.SmoothTransformation
-                )
-                self.reminder_image.setPixmap(pixmap)
+                # The cached thumbnail already fits the 80x80 label
+                self.reminder_image.setPixmap(QPixmap.fromImage(qt_image))
                 
                 self.overlay.show()
                 self.reminder_panel.show()
@@ -569,18 +642,13 @@ class TrafficSignApp(QMainWindow):
 
     def toggle_audio(self, state):
         self.enable_audio = state == Qt.CheckState.Checked.value
-        if not self.enable_audio:
-            try:
-                engine = pyttsx3.init()
-                engine.stop()
-            except:
-                pass
+        self.tts_sink.enabled = self.enable_audio
 
     def toggle_reminders(self, state):
         self.enable_reminder = state == Qt.CheckState.Checked.value
         if not self.enable_reminder:
             self.reminder_panel.hide()
-            self.reminder_scheduled.clear()
+            self.alert_bus.cancel_scheduled()
             if not self.notification_panel.isVisible():
                 self.overlay.hide()
 
@@ -656,7 +724,7 @@ class TrafficSignApp(QMainWindow):
                 """)
             
             # Clear any existing reminders when duration changes
-            self.reminder_scheduled.clear()
+            self.alert_bus.cancel_scheduled()
             if self.reminder_panel.isVisible():
                 self.reminder_panel.hide()
                 if not self.notification_panel.isVisible():
@@ -666,7 +734,15 @@ class TrafficSignApp(QMainWindow):
 
     def closeEvent(self, event):
         if self.cap is not None:
-            self.cap.release()
+            self.cap.close()
+        if self.event_logger is not None:
+            self.event_logger.close()
+        if self.broadcaster is not None:
+            self.stream_server.shutdown()
+            self.broadcaster.close()
+        self.alert_bus.close()
+        print(self.alert_bus.report())
+        self.profiler.close()
         event.accept()
 
     def keyPressEvent(self, event):
@@ -676,6 +752,7 @@ class TrafficSignApp(QMainWindow):
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
-    window = TrafficSignApp()
+    # Optional source argument, e.g. "usb1", "rtsp://..." or "synthetic:test_dir@15"
+    window = TrafficSignApp(sys.argv[1] if len(sys.argv) > 1 else "usb0")
     window.show()
     sys.exit(app.exec()) 
\ No newline at end of file
@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import socket
+import argparse
+import threading
+import http.client
+import socketserver
+from queue import Queue, Empty
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import cv2
+import numpy as np
+
+from preprocess import Letterbox, parse_imgsz
+from detections import run_detector, to_records
+
+# Local inference server that loads the model once and serves every process
+# that needs sign detection. Requests arriving close together are grouped into
+# one batch, e.g.
+#   python inference_server.py --model my_model.pt --port 8765
+#   python inference_server.py --model my_model.pt --unix /tmp/signs.sock
+#
+# POST /detect with an encoded image (JPEG/PNG) as the body returns
+#   {"detections": [...records as printed by yolo_detect.py --print-detections...],
+#    "batch_size": n, "inference_ms": t}
+
+
+class _Request:
+    def __init__(self, image, thresh):
+        self.image = image
+        self.thresh = thresh
+        self.done = threading.Event()
+        self.response = None
+
+
+class DynamicBatcher:
+    # Collects requests from many client threads and runs them through the
+    # model together. A batch starts with the first waiting request and is
+    # closed once max_batch requests are queued or max_wait_ms has passed.
+
+    def __init__(self, model, imgsz=(640, 640), max_batch=8, max_wait_ms=5):
+        self.model = model
+        self.labels = model.names
+        self.imgsz = imgsz
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.letterboxes = [Letterbox(imgsz) for _ in range(max_batch)]
+        self.queue = Queue()
+        self.batches = 0
+        self.requests = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, image, thresh=0.5):
+        request = _Request(image, thresh)
+        self.queue.put(request)
+        request.done.wait()
+        return request.response
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            t_start = time.perf_counter()
+            try:
+                outputs = run_detector(self.model, self.letterboxes, [r.image for r in batch], self.imgsz)
+                inference_ms = (time.perf_counter() - t_start) * 1000
+                for request, (boxes, class_ids, confidences) in zip(batch, outputs):
+                    request.response = {'detections': to_records(self.labels, boxes, class_ids, confidences, request.thresh),
+                                        'batch_size': len(batch), 'inference_ms': round(inference_ms, 2)}
+            except Exception as e:
+                for request in batch:
+                    request.response = {'error': str(e)}
+            self.batches += 1
+            self.requests += len(batch)
+            for request in batch:
+                request.done.set()
+
+
+class DetectHandler(BaseHTTPRequestHandler):
+    batcher = None
+    # The reply goes out as a header write and a body write. With Nagle's
+    # algorithm the body waits for the client's delayed ACK, about 40 ms per
+    # request on a keep-alive connection.
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        # Unix sockets have no TCP_NODELAY and no Nagle delay to avoid
+        if self.request.family == socket.AF_UNIX:
+            self.disable_nagle_algorithm = False
+        super().setup()
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if urlparse(self.path).path != '/health':
+            return self._reply(404, {'error': 'not found'})
+        batcher = self.batcher
+        self._reply(200, {'status': 'ok', 'requests': batcher.requests, 'batches': batcher.batches,
+                          'mean_batch': round(batcher.requests / max(1, batcher.batches), 2)})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/detect':
+            return self._reply(404, {'error': 'not found'})
+        length = int(self.headers.get('Content-Length', 0))
+        data = np.frombuffer(self.rfile.read(length), dtype=np.uint8)
+        image = cv2.imdecode(data, cv2.IMREAD_COLOR) if length else None
+        if image is None:
+            return self._reply(400, {'error': 'body is not a decodable image'})
+        try:
+            thresh = float(parse_qs(url.query).get('thresh', ['0.5'])[0])
+        except ValueError:
+            return self._reply(400, {'error': 'thresh must be a number'})
+        response = self.batcher.submit(image, thresh)
+        self._reply(500 if 'error' in response else 200, response)
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=10):
+        super().__init__('localhost', timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+class _TcpConnection(http.client.HTTPConnection):
+    def connect(self):
+        super().connect()
+        # Send requests right away, see DetectHandler.disable_nagle_algorithm
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class RemoteDetector:
+    # Client for the server, address is "http://host:port" or "unix:/path".
+    # Keeps one connection open, use one instance per thread.
+
+    def __init__(self, address='http://127.0.0.1:8765', jpeg_quality=90, timeout=10):
+        self.address = address
+        self.jpeg_quality = jpeg_quality
+        self.timeout = timeout
+        self.conn = None
+
+    def _connect(self):
+        if self.address.startswith('unix:'):
+            return _UnixConnection(self.address[5:], self.timeout)
+        url = urlparse(self.address)
+        return _TcpConnection(url.hostname, url.port or 80, timeout=self.timeout)
+
+    def detect_encoded(self, data, thresh=0.5):
+        # Send an already encoded image and return the server response
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = self._connect()
+            try:
+                self.conn.request('POST', f'/detect?thresh={thresh}', body=data,
+                                  headers={'Content-Type': 'image/jpeg'})
+                return json.loads(self.conn.getresponse().read())
+            except (ConnectionError, http.client.HTTPException):
+                # Reconnect once if the server closed an idle keep-alive connection
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+    def detect(self, frame, thresh=0.5):
+        ok, data = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        return self.detect_encoded(data.tobytes(), thresh)['detections']
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+
+if __name__ == '__main__':
+    from ultralytics import YOLO
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', help='Path to YOLO model file (example: "my_model.pt")', default='my_model.pt')
+    parser.add_argument('--host', help='Address to listen on (default: 127.0.0.1)', default='127.0.0.1')
+    parser.add_argument('--port', help='TCP port to listen on (default: 8765)', type=int, default=8765)
+    parser.add_argument('--unix', help='Listen on this Unix socket path instead of TCP', default=None)
+    parser.add_argument('--imgsz', help='Inference input size (default: 640)', default='640')
+    parser.add_argument('--max-batch', help='Largest batch to run at once (default: 8)', type=int, default=8)
+    parser.add_argument('--max-wait-ms', help='Longest time the first request of a batch waits for others (default: 5)',
+                        type=float, default=5)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        print('ERROR: Model path is invalid or model was not found. Make sure the model filename was entered correctly.')
+        raise SystemExit(0)
+    imgsz = parse_imgsz(args.imgsz)
+    model = YOLO(args.model, task='detect')
+    DetectHandler.batcher = DynamicBatcher(model, imgsz, args.max_batch, args.max_wait_ms)
+    DetectHandler.protocol_version = 'HTTP/1.1'  # Keep-alive so clients reuse connections
+
+    if args.unix:
+        if os.path.exists(args.unix):
+            os.remove(args.unix)
+        server = ThreadingUnixHTTPServer(args.unix, DetectHandler)
+        print(f'Serving {args.model} on unix:{args.unix}')
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), DetectHandler)
+        print(f'Serving {args.model} on http://{args.host}:{args.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.unix and os.path.exists(args.unix):
+            os.remove(args.unix)
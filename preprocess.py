@@ -0,0 +1,92 @@
+import cv2
+import numpy as np
+
+# Padding colour used by Ultralytics when letterboxing training images
+PAD_COLOR = (114, 114, 114)
+
+# Model stride, inference sizes must be a multiple of this
+STRIDE = 32
+
+
+def parse_imgsz(text):
+    # Accept "640" for a square input or "WxH" for a rectangular one
+    text = str(text).lower()
+    if 'x' in text:
+        w, h = int(text.split('x')[0]), int(text.split('x')[1])
+    else:
+        w = h = int(text)
+    # Round up to the model stride so Ultralytics does not pad the input again
+    w = -(-w // STRIDE) * STRIDE
+    h = -(-h // STRIDE) * STRIDE
+    return w, h
+
+
+class Letterbox:
+    # Resizes frames into a reused, pre-padded inference buffer and maps
+    # detections back to display coordinates
+
+    def __init__(self, imgsz=640, color_code=None):
+        if isinstance(imgsz, int):
+            imgsz = (imgsz, imgsz)
+        self.width, self.height = imgsz
+        self.color_code = color_code
+        self.buffer = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        self.src_shape = None
+        self.scale = 1.0
+        self.pad_x = 0
+        self.pad_y = 0
+        self.view = None
+
+    def _configure(self, src_h, src_w):
+        # Recompute the geometry only when the source size changes
+        self.src_shape = (src_h, src_w)
+        self.scale = min(self.width / src_w, self.height / src_h)
+        new_w = min(self.width, int(round(src_w * self.scale)))
+        new_h = min(self.height, int(round(src_h * self.scale)))
+        self.pad_x = (self.width - new_w) // 2
+        self.pad_y = (self.height - new_h) // 2
+        self.buffer[:] = PAD_COLOR
+        self.view = self.buffer[self.pad_y:self.pad_y+new_h, self.pad_x:self.pad_x+new_w]
+        self.interpolation = cv2.INTER_AREA if self.scale < 1 else cv2.INTER_LINEAR
+
+    def __call__(self, frame):
+        if frame.shape[:2] != self.src_shape:
+            self._configure(frame.shape[0], frame.shape[1])
+        if frame.ndim == 3 and frame.shape[2] == 4:
+            frame = frame[:, :, :3]
+
+        # Resize straight into the padded buffer, no intermediate copies
+        if self.view.shape[:2] == frame.shape[:2]:
+            np.copyto(self.view, frame)
+        else:
+            cv2.resize(frame, (self.view.shape[1], self.view.shape[0]),
+                       dst=self.view, interpolation=self.interpolation)
+
+        # Colour conversion happens in place on the smaller image
+        if self.color_code is not None:
+            cv2.cvtColor(self.view, self.color_code, dst=self.view)
+        return self.buffer
+
+    def unmap(self, boxes, out_shape=None):
+        # Map xyxy boxes from inference coordinates to the source frame, or to
+        # out_shape (h, w) when the frame is displayed at another resolution
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4).copy()
+        if self.src_shape is None or len(boxes) == 0:
+            return boxes
+        src_h, src_w = self.src_shape
+        boxes[:, [0, 2]] -= self.pad_x
+        boxes[:, [1, 3]] -= self.pad_y
+        boxes /= self.scale
+        boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, src_w)
+        boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, src_h)
+        if out_shape is not None:
+            boxes = scale_boxes(boxes, self.src_shape, out_shape)
+        return boxes
+
+
+def scale_boxes(boxes, src_shape, out_shape):
+    # Scale xyxy boxes from a (h, w) frame to another (h, w) frame in place
+    if tuple(out_shape[:2]) != tuple(src_shape[:2]):
+        boxes[:, [0, 2]] *= out_shape[1] / src_shape[1]
+        boxes[:, [1, 3]] *= out_shape[0] / src_shape[0]
+    return boxes
@@ -0,0 +1,168 @@
+import os
+import sys
+import glob
+import json
+import time
+import queue
+import pstats
+import cProfile
+import threading
+from collections import Counter, deque
+
+
+class SlowFrameProfiler:
+    # Opt-in field profiling. A background thread samples the main thread's
+    # Python stack every sample_interval seconds into a short ring buffer, and
+    # the frame loop marks the end of each stage. When a frame goes over the
+    # latency budget, its stage timings, metadata and the stacks sampled
+    # during it are written out, and cProfile runs on the next profile_frames
+    # frames to get a detailed profile. Profiled frames are never counted as
+    # slow, and slow frames within cooldown_frames of a capture are counted
+    # but not captured, so one stall gives one capture. Files are
+    # written by a background thread and only the newest max_files are kept.
+
+    def __init__(self, budget_ms, out_dir='profiles', max_files=20, sample_interval=0.005, profile_frames=5,
+                 cooldown_frames=300):
+        self.budget = budget_ms / 1000
+        self.out_dir = out_dir
+        self.max_files = max_files
+        self.sample_interval = sample_interval
+        self.profile_frames = profile_frames
+        self.cooldown_frames = cooldown_frames
+        self.frames = 0
+        self.slow_frames = 0
+        self.captures = 0
+        os.makedirs(out_dir, exist_ok=True)
+
+        self._main_id = threading.main_thread().ident
+        self._samples = deque(maxlen=max(100, int(2.0 / sample_interval)))  # About two seconds of stacks
+        self._frame_start = 0.0
+        self._last_mark = 0.0
+        self._stages = {}
+        self._profile = None
+        self._profile_left = 0
+        self._profiling = False  # The current frame runs under cProfile
+        self._next_capture = 0  # First frame number outside the cooldown
+        self._capture_name = None
+        self._writes = queue.Queue()
+        self._stop = threading.Event()
+        threading.Thread(target=self._sample, daemon=True).start()
+        self._writer = threading.Thread(target=self._write, daemon=True)
+        self._writer.start()
+
+    def _sample(self):
+        # Store (time, code objects and line numbers) only, resolving names is
+        # left until a slow frame is actually written out
+        while not self._stop.wait(self.sample_interval):
+            frame = sys._current_frames().get(self._main_id)
+            stack = []
+            while frame is not None:
+                stack.append((frame.f_code, frame.f_lineno))
+                frame = frame.f_back
+            self._samples.append((time.perf_counter(), tuple(stack)))
+
+    def begin_frame(self):
+        self._frame_start = self._last_mark = time.perf_counter()
+        self._stages = {}
+        self._profiling = self._profile is not None
+        if self._profiling:
+            self._profile.enable()
+
+    def mark(self, stage):
+        # Record the time since the previous mark (or frame start) as stage
+        now = time.perf_counter()
+        self._stages[stage] = self._stages.get(stage, 0.0) + now - self._last_mark
+        self._last_mark = now
+
+    def end_frame(self, **metadata):
+        # Returns the frame latency in seconds
+        now = time.perf_counter()
+        latency = now - self._frame_start
+        self.frames += 1
+
+        if self._profiling:
+            # Profiler overhead makes these frames slow, they are not counted
+            self._profile.disable()
+            self._profiling = False
+            self._profile_left -= 1
+            if self._profile_left <= 0:
+                self._writes.put(('profile', self._capture_name, self._profile))
+                self._profile = None
+            return latency
+
+        if latency > self.budget:
+            self.slow_frames += 1
+            if self.frames < self._next_capture:
+                return latency
+            self.captures += 1
+            self._next_capture = self.frames + self.cooldown_frames
+            start = self._frame_start
+            samples = [stack for t, stack in list(self._samples) if t >= start]
+            capture = {
+                'time': time.time(),
+                'latency_ms': round(latency * 1000, 2),
+                'budget_ms': round(self.budget * 1000, 2),
+                'stages_ms': {k: round(v * 1000, 2) for k, v in self._stages.items()},
+                'metadata': metadata,
+            }
+            name = time.strftime('slow-%Y%m%d-%H%M%S') + f'-{self.captures:05d}'
+            self._writes.put(('capture', name, (capture, samples)))
+            self._profile = cProfile.Profile()
+            self._profile_left = self.profile_frames
+            self._capture_name = name
+        return latency
+
+    @staticmethod
+    def _summarize_stacks(samples, top=15):
+        # Most frequent stacks, innermost frame first
+        counts = Counter(samples)
+        return [{'count': count,
+                 'stack': [f'{code.co_filename}:{line} {code.co_name}' for code, line in stack]}
+                for stack, count in counts.most_common(top)]
+
+    def _write(self):
+        while True:
+            kind, name, payload = self._writes.get()
+            if kind is None:
+                return
+            if kind == 'capture':
+                capture, samples = payload
+                capture['samples'] = len(samples)
+                capture['stacks'] = self._summarize_stacks(samples)
+                with open(os.path.join(self.out_dir, name + '.json'), 'w') as f:
+                    json.dump(capture, f, indent=1, default=str)
+            else:
+                stats = pstats.Stats(payload)
+                stats.dump_stats(os.path.join(self.out_dir, name + '.prof'))
+            self._rotate()
+
+    def _rotate(self):
+        for pattern in ('*.json', '*.prof'):
+            files = sorted(glob.glob(os.path.join(self.out_dir, 'slow-' + pattern)))
+            for path in files[:-self.max_files]:
+                os.remove(path)
+
+    def close(self):
+        # Write a partly collected profile and everything still queued
+        self._stop.set()
+        if self._profile is not None:
+            self._writes.put(('profile', self._capture_name, self._profile))
+            self._profile = None
+        self._writes.put((None, None, None))
+        self._writer.join(timeout=10)
+
+
+class NullProfiler:
+    # Stand-in when profiling is off, every hook is a no-op
+
+    def begin_frame(self):
+        pass
+
+    def mark(self, stage):
+        pass
+
+    def end_frame(self, **metadata):
+        return 0.0
+
+    def close(self):
+        pass
@@ -0,0 +1,182 @@
+import time
+
+import cv2
+import numpy as np
+
+from preprocess import Letterbox
+from detections import run_detector
+
+# HSV ranges (OpenCV hue is 0-179) of the red, blue and yellow used on road signs
+SIGN_HSV_RANGES = [
+    ((0, 90, 60), (10, 255, 255)),     # Red, low hue end
+    ((165, 90, 60), (179, 255, 255)),  # Red, high hue end
+    ((100, 120, 50), (130, 255, 255)), # Blue
+    ((18, 110, 90), (35, 255, 255)),   # Yellow
+]
+
+
+def propose_regions(frame, work_width=320, min_area=40, max_aspect=2.5, min_fill=0.25, pad=0.3):
+    # Find compact blobs of sign colours on a downscaled copy of the frame and
+    # return their padded xyxy boxes in frame coordinates
+    h, w = frame.shape[:2]
+    scale = min(1.0, work_width / w)
+    small = cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA) if scale < 1 else frame
+    hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+
+    mask = cv2.inRange(hsv, SIGN_HSV_RANGES[0][0], SIGN_HSV_RANGES[0][1])
+    for low, high in SIGN_HSV_RANGES[1:]:
+        mask |= cv2.inRange(hsv, low, high)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((3, 3), np.uint8))
+
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    stats = stats[1:]  # Drop the background component
+    bw, bh, area = stats[:, cv2.CC_STAT_WIDTH], stats[:, cv2.CC_STAT_HEIGHT], stats[:, cv2.CC_STAT_AREA]
+
+    # Shape filter: signs are compact (circle, triangle, square, octagon) and
+    # their colour fills a good part of the bounding box (rings included)
+    aspect = np.maximum(bw, bh) / np.maximum(1, np.minimum(bw, bh))
+    fill = area / np.maximum(1, bw * bh)
+    keep = (area >= min_area) & (aspect <= max_aspect) & (fill >= min_fill)
+    stats = stats[keep].astype(np.float32)
+    if len(stats) == 0:
+        return np.zeros((0, 4), dtype=np.float32)
+
+    boxes = np.stack([stats[:, 0], stats[:, 1], stats[:, 0] + stats[:, 2], stats[:, 1] + stats[:, 3]], axis=1) / scale
+    size = np.maximum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])[:, None] * pad
+    boxes += np.hstack([-size, -size, size, size])
+    boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, w)
+    boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, h)
+    return boxes
+
+
+def merge_boxes(boxes, gap=16):
+    # Merge boxes that overlap or are within gap pixels until none do
+    boxes = boxes.copy()
+    while len(boxes) > 1:
+        grown = boxes + np.array([-gap, -gap, gap, gap], dtype=np.float32)
+        overlap = ((grown[:, None, 0] < grown[None, :, 2]) & (grown[None, :, 0] < grown[:, None, 2]) &
+                   (grown[:, None, 1] < grown[None, :, 3]) & (grown[None, :, 1] < grown[:, None, 3]))
+        np.fill_diagonal(overlap, False)
+        if not overlap.any():
+            break
+        # Fold every box into the first box it touches
+        first = np.where(overlap.any(axis=1), overlap.argmax(axis=1), np.arange(len(boxes)))
+        root = np.minimum(np.arange(len(boxes)), first)
+        merged = np.zeros((len(np.unique(root)), 4), dtype=np.float32)
+        for i, r in enumerate(np.unique(root)):
+            group = boxes[root == r]
+            merged[i] = (group[:, 0].min(), group[:, 1].min(), group[:, 2].max(), group[:, 3].max())
+        if len(merged) == len(boxes):
+            break
+        boxes = merged
+    return boxes
+
+
+def box_iou(a, b):
+    # Pairwise IoU of two sets of xyxy boxes
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / np.maximum(1e-6, area_a[:, None] + area_b[None, :] - inter)
+
+
+class CascadeDetector:
+    # Runs the model only on merged colour proposals, batched, when there are
+    # few of them and they cover a small part of the frame. Otherwise, and
+    # every full_every frames as a safety net, it runs on the full frame.
+
+    def __init__(self, model, imgsz=(640, 640), crop_size=320, max_crops=4, max_coverage=0.3, full_every=15):
+        self.model = model
+        self.imgsz = imgsz
+        self.crop_imgsz = (crop_size, crop_size)
+        self.crop_size = crop_size
+        self.max_crops = max_crops
+        self.max_coverage = max_coverage
+        self.full_every = full_every
+        self.full_letterbox = Letterbox(imgsz)
+        self.crop_letterboxes = [Letterbox(crop_size) for _ in range(max_crops)]
+        self.frames = 0
+        self.full_frames = 0
+        self.crop_frames = 0
+        self.empty_frames = 0
+
+    def _crop_regions(self, frame, boxes):
+        # Grow each region to at least the crop size so small signs are not
+        # upscaled past what the model saw in training
+        h, w = frame.shape[:2]
+        cx, cy = (boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2
+        half = np.maximum(np.maximum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]), self.crop_size) / 2
+        x0 = np.clip(cx - half, 0, None).astype(int)
+        y0 = np.clip(cy - half, 0, None).astype(int)
+        x1 = np.minimum(w, (cx + half).astype(int))
+        y1 = np.minimum(h, (cy + half).astype(int))
+        return np.stack([x0, y0, x1, y1], axis=1)
+
+    def detect(self, frame):
+        # Returns (boxes, class_ids, confidences) in frame coordinates, like run_detector
+        self.frames += 1
+        proposals = merge_boxes(propose_regions(frame))
+        h, w = frame.shape[:2]
+        coverage = np.sum(np.prod(proposals[:, 2:] - proposals[:, :2], axis=1)) / (h * w) if len(proposals) else 0
+
+        if self.frames % self.full_every == 0 or len(proposals) > self.max_crops or coverage > self.max_coverage:
+            self.full_frames += 1
+            return run_detector(self.model, [self.full_letterbox], [frame], self.imgsz)[0]
+        if len(proposals) == 0:
+            self.empty_frames += 1
+            return np.zeros((0, 4), np.float32), np.zeros(0, int), np.zeros(0, np.float32)
+
+        self.crop_frames += 1
+        regions = self._crop_regions(frame, proposals)
+        crops = [frame[y0:y1, x0:x1] for x0, y0, x1, y1 in regions]
+        outputs = run_detector(self.model, self.crop_letterboxes[:len(crops)], crops, self.crop_imgsz)
+        boxes = np.concatenate([b + np.array([x0, y0, x0, y0], np.float32)
+                                for (b, _, _), (x0, y0, _, _) in zip(outputs, regions)])
+        class_ids = np.concatenate([c for _, c, _ in outputs])
+        confidences = np.concatenate([c for _, _, c in outputs])
+
+        # Crops can overlap, drop duplicate boxes of the same sign
+        if len(boxes) > 1:
+            keep = cv2.dnn.NMSBoxesBatched(
+                [[float(x0), float(y0), float(x1 - x0), float(y1 - y0)] for x0, y0, x1, y1 in boxes],
+                confidences.astype(float).tolist(), class_ids.tolist(), 0.0, 0.5)
+            keep = np.asarray(keep, dtype=int).reshape(-1)
+            boxes, class_ids, confidences = boxes[keep], class_ids[keep], confidences[keep]
+        return boxes, class_ids, confidences
+
+
+class CascadeEvaluator:
+    # Compares cascade detections against full-frame inference on the same
+    # frames: recall of full-frame detections and CPU time spent by each
+
+    def __init__(self, thresh=0.5, iou=0.5):
+        self.thresh = thresh
+        self.iou = iou
+        self.reference = 0
+        self.matched = 0
+        self.full_cpu = 0.0
+        self.cascade_cpu = 0.0
+
+    def measure(self, detect, frame):
+        # Run detect(frame) and return its result and the CPU time it used
+        t_start = time.process_time()
+        result = detect(frame)
+        return result, time.process_time() - t_start
+
+    def update(self, full, cascade, full_cpu, cascade_cpu):
+        self.full_cpu += full_cpu
+        self.cascade_cpu += cascade_cpu
+        ref_boxes, ref_cls, ref_conf = (a[full[2] > self.thresh] for a in full)
+        boxes, cls, conf = (a[cascade[2] > self.thresh] for a in cascade)
+        self.reference += len(ref_boxes)
+        if len(ref_boxes) and len(boxes):
+            iou = box_iou(ref_boxes, boxes) * (ref_cls[:, None] == cls[None, :])
+            self.matched += int(np.count_nonzero(iou.max(axis=1) >= self.iou))
+
+    def report(self):
+        recall = self.matched / self.reference if self.reference else 1.0
+        saved = 1 - self.cascade_cpu / self.full_cpu if self.full_cpu else 0.0
+        return (f'Cascade recall vs full frame: {recall:.1%} ({self.matched}/{self.reference} boxes), '
+                f'CPU time full: {self.full_cpu:.1f}s cascade: {self.cascade_cpu:.1f}s (saved {saved:.1%})')
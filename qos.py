@@ -0,0 +1,72 @@
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+
+from preprocess import Letterbox, parse_imgsz
+
+# One rung of the quality ladder: a preloaded model and its inference size
+QosLevel = namedtuple('QosLevel', ['name', 'model', 'imgsz', 'letterbox'])
+
+
+def parse_levels(text):
+    # "yolo11s.pt@640,yolo11n.pt@480" -> [('yolo11s.pt', (640, 640)), ('yolo11n.pt', (480, 480))]
+    levels = []
+    for item in text.split(','):
+        path, _, size = item.strip().rpartition('@')
+        if not path:
+            raise ValueError(f'QoS level "{item}" must look like model.pt@640')
+        levels.append((path, parse_imgsz(size)))
+    return levels
+
+
+def build_levels(level_specs, load_model):
+    # Load every model once, levels sharing a file share the model instance
+    models = {}
+    levels = []
+    for path, imgsz in level_specs:
+        if path not in models:
+            models[path] = load_model(path)
+        name = f'{path.rsplit("/", 1)[-1].rsplit(".", 1)[0]}@{imgsz[0]}'
+        levels.append(QosLevel(name, models[path], imgsz, Letterbox(imgsz)))
+    return levels
+
+
+class QosController:
+    # Steps down the quality ladder when the 90th percentile of recent frame
+    # latencies misses the deadline, and back up when it is comfortably under
+    # it. hold_frames after every change and the gap between the down and up
+    # thresholds keep it from flapping between two levels.
+
+    def __init__(self, levels, target_ms, window=30, up_ratio=0.6, hold_frames=30):
+        self.levels = levels
+        self.target = target_ms / 1000
+        self.up_ratio = up_ratio
+        self.hold_frames = hold_frames
+        self.latencies = deque(maxlen=window)
+        self.index = 0
+        self.frames_at_level = 0
+        self.changes = []  # (time, level name, p90 latency in ms)
+
+    @property
+    def current(self):
+        return self.levels[self.index]
+
+    def update(self, latency):
+        # Record one frame latency in seconds, returns True if the level changed
+        self.latencies.append(latency)
+        self.frames_at_level += 1
+        if self.frames_at_level < self.hold_frames or len(self.latencies) < self.latencies.maxlen // 2:
+            return False
+        p90 = float(np.percentile(self.latencies, 90))
+        if p90 > self.target and self.index < len(self.levels) - 1:
+            self.index += 1
+        elif p90 < self.target * self.up_ratio and self.index > 0 and self.frames_at_level >= 2 * self.hold_frames:
+            self.index -= 1
+        else:
+            return False
+        self.frames_at_level = 0
+        self.latencies.clear()
+        self.changes.append((time.time(), self.current.name, p90 * 1000))
+        print(f'QoS: switched to {self.current.name} (p90 latency {p90 * 1000:.0f} ms, target {self.target * 1000:.0f} ms)')
+        return True
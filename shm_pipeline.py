@@ -0,0 +1,295 @@
+import time
+import queue
+from collections import deque
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from frame_sources import Frame, open_source
+from preprocess import Letterbox
+from detections import run_detector
+from tuning import apply_tuning
+
+# Control block slots in the shared ring
+WRITE_SEQ = 0  # Next sequence number the capture process will write
+INFER_SEQ = 1  # Next sequence number the inference process will read
+READ_SEQ = 2   # Sequence numbers below this have been consumed by the display
+EOF = 3        # Set to 1 when the source has no more frames
+ENDED_AT = 4   # Final WRITE_SEQ once EOF is set
+CONTROL_SIZE = 8
+
+
+class FrameRing:
+    # Fixed number of frame slots in one shared memory block. Each slot has a
+    # sequence number that the writer sets to -1 while writing (a seqlock), so
+    # readers can detect frames that were overwritten while being copied.
+
+    def __init__(self, slots=8, frame_shape=(1080, 1920, 3), name=None):
+        self.slots = slots
+        self.frame_shape = tuple(frame_shape)
+        control_bytes = CONTROL_SIZE * 8
+        meta_bytes = slots * 4 * 8
+        stamp_bytes = slots * 8
+        frame_bytes = int(np.prod(self.frame_shape))
+        size = control_bytes + meta_bytes + stamp_bytes + slots * frame_bytes
+
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+
+        buf = self.shm.buf
+        offset = 0
+        self.control = np.ndarray((CONTROL_SIZE,), np.int64, buf, offset)
+        offset += control_bytes
+        self.meta = np.ndarray((slots, 4), np.int64, buf, offset)  # seq, index, height, width
+        offset += meta_bytes
+        self.stamps = np.ndarray((slots,), np.float64, buf, offset)
+        offset += stamp_bytes
+        self.frames = np.ndarray((slots,) + self.frame_shape, np.uint8, buf, offset)
+        if self.owner:
+            self.control[:] = 0
+            self.meta[:, 0] = -1
+
+    def write(self, seq, image, timestamp, index):
+        slot = seq % self.slots
+        self.meta[slot, 0] = -1
+        h, w = image.shape[:2]
+        max_h, max_w = self.frame_shape[:2]
+        if h > max_h or w > max_w:
+            # Frames larger than the ring slots are shrunk to fit
+            scale = min(max_w / w, max_h / h)
+            h, w = int(h * scale), int(w * scale)
+            cv2.resize(image, (w, h), dst=self.frames[slot, :h, :w], interpolation=cv2.INTER_AREA)
+        else:
+            np.copyto(self.frames[slot, :h, :w], image[:, :, :3])
+        self.meta[slot, 1:] = (index, h, w)
+        self.stamps[slot] = timestamp
+        self.meta[slot, 0] = seq
+        self.control[WRITE_SEQ] = seq + 1
+
+    def view(self, seq):
+        # Zero-copy view of a slot, or None if it no longer holds seq. Callers
+        # must check valid(seq) again after using the view.
+        slot = seq % self.slots
+        if self.meta[slot, 0] != seq:
+            return None
+        index, h, w = self.meta[slot, 1:]
+        return Frame(self.frames[slot, :h, :w], self.frames[slot, :h, :w], float(self.stamps[slot]), int(index))
+
+    def valid(self, seq):
+        return self.meta[seq % self.slots, 0] == seq
+
+    def close(self):
+        # Drop the numpy views before closing the mapping
+        self.control = self.meta = self.stamps = self.frames = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _capture_worker(spec, ring_name, slots, frame_shape, resolution, stop_event, skip_frames, tuning, info):
+    apply_tuning(tuning, ['capture'])
+    ring = FrameRing(slots, frame_shape, name=ring_name)
+    try:
+        source = open_source(spec, resolution=resolution)
+    except ValueError as e:
+        info.put(('error', str(e)))
+        ring.close()
+        return
+    # Only this process opens the source, the parent learns about it here
+    info.put(('source', source.source_type, source.live, source.end_message))
+    try:
+        # After a restart, skip the frames a file source already delivered
+        for _ in range(0 if source.live else skip_frames):
+            if source.read() is None:
+                break
+        seq = int(ring.control[WRITE_SEQ])
+        while not stop_event.is_set():
+            # File sources wait for the display so no frame is dropped, live
+            # sources overwrite the oldest slot instead
+            if not source.live:
+                while seq - ring.control[READ_SEQ] >= slots - 1 and not stop_event.is_set():
+                    time.sleep(0.001)
+            captured = source.read()
+            if captured is None:
+                ring.control[ENDED_AT] = seq
+                ring.control[EOF] = 1
+                break
+            ring.write(seq, captured.image, captured.timestamp, captured.index)
+            seq += 1
+    finally:
+        source.close()
+        ring.close()
+
+
+def _inference_worker(model_path, ring_name, slots, frame_shape, imgsz, live, results, stop_event, tuning, info):
+    from ultralytics import YOLO
+
+    apply_tuning(tuning, ['inference'])
+    ring = FrameRing(slots, frame_shape, name=ring_name)
+    model = YOLO(model_path, task='detect')
+    info.put(('names', dict(model.names)))
+    letterbox = Letterbox(imgsz)
+    try:
+        while not stop_event.is_set():
+            write_seq = int(ring.control[WRITE_SEQ])
+            seq = int(ring.control[INFER_SEQ])
+            if seq >= write_seq:
+                if ring.control[EOF] and seq >= ring.control[ENDED_AT]:
+                    results.put(None)
+                    break
+                time.sleep(0.001)
+                continue
+            if live:
+                seq = write_seq - 1  # Always work on the newest frame
+            captured = ring.view(seq)
+            if captured is not None:
+                src_shape = captured.image.shape
+                boxes, class_ids, confidences = run_detector(model, [letterbox], [captured.infer_image], imgsz)[0]
+                # Letterboxing copied the frame out of the ring, drop the result
+                # if the slot was overwritten while that copy was being made
+                if ring.valid(seq):
+                    results.put((seq, src_shape, boxes, class_ids, confidences))
+            ring.control[INFER_SEQ] = seq + 1
+    finally:
+        ring.close()
+
+
+class Pipeline:
+    # Runs capture and inference in two child processes connected by a
+    # FrameRing. Only small detection arrays travel back over a queue, the
+    # frames themselves never get pickled. Only the workers open the source
+    # and load the model, they report what the parent needs on an info queue.
+    # Dead workers are restarted, up to max_restarts within restart_window
+    # seconds.
+
+    def __init__(self, spec, model_path, imgsz=(640, 640), resolution=None, live=None,
+                 slots=8, frame_shape=None, max_restarts=3, restart_window=600.0, tuning=None,
+                 startup_timeout=60.0):
+        self.spec = spec
+        self.model_path = model_path
+        self.imgsz = imgsz
+        self.resolution = resolution
+        self.slots = slots
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+        self.tuning = tuning  # Thread and core profile from autotune.py, applied per worker
+        self.restarts = 0
+        self._restart_times = deque()
+        self.frames_dropped = 0
+        if frame_shape is None:
+            frame_shape = (resolution[1], resolution[0], 3) if resolution else (1080, 1920, 3)
+        self.frame_shape = frame_shape
+
+        # Fork where available, the frontends are scripts without a __main__
+        # guard and spawn would re-run them in every child. The parent has
+        # not run inference yet, so no torch thread pools are copied.
+        self.ctx = mp.get_context('fork' if 'fork' in mp.get_all_start_methods() else 'spawn')
+        self.ring = FrameRing(slots, frame_shape)
+        self.stop_event = self.ctx.Event()
+        self.results = self.ctx.Queue(maxsize=slots)
+        self.info = self.ctx.Queue()
+        self.capture = None
+        self.inference = None
+        try:
+            # The capture process opens the source, a camera must not be held
+            # open by the parent as well
+            self._start_capture()
+            _, self.source_type, source_live, self.end_message = self._wait_info('source', self.capture, startup_timeout)
+            self.live = source_live if live is None else live
+            self._start_inference()
+            _, self.names = self._wait_info('names', self.inference, startup_timeout)
+        except BaseException:
+            self.close()
+            raise
+
+    def _wait_info(self, kind, process, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                message = self.info.get(timeout=0.5)
+            except queue.Empty:
+                if not process.is_alive():
+                    raise RuntimeError(f'{process.name} exited with code {process.exitcode} while starting')
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f'{process.name} did not start within {timeout:g} s')
+                continue
+            if message[0] == 'error':
+                raise ValueError(message[1])
+            if message[0] == kind:
+                return message
+
+    def _start_capture(self):
+        args = (self.spec, self.ring.name, self.slots, self.frame_shape, self.resolution,
+                self.stop_event, int(self.ring.control[WRITE_SEQ]), self.tuning, self.info)
+        self.capture = self.ctx.Process(target=_capture_worker, args=args, name='capture process', daemon=True)
+        self.capture.start()
+
+    def _start_inference(self):
+        args = (self.model_path, self.ring.name, self.slots, self.frame_shape, self.imgsz,
+                self.live, self.results, self.stop_event, self.tuning, self.info)
+        self.inference = self.ctx.Process(target=_inference_worker, args=args, name='inference process', daemon=True)
+        self.inference.start()
+
+    def _check_workers(self):
+        # Restart a worker that died without finishing its work, unless the
+        # workers already failed max_restarts times within restart_window
+        while True:
+            try:
+                self.info.get_nowait()  # Startup messages of restarted workers
+            except queue.Empty:
+                break
+        for name in ('capture', 'inference'):
+            process = getattr(self, name)
+            if process.is_alive() or process.exitcode == 0:
+                continue
+            now = time.monotonic()
+            while self._restart_times and now - self._restart_times[0] > self.restart_window:
+                self._restart_times.popleft()
+            if len(self._restart_times) >= self.max_restarts:
+                raise RuntimeError(f'{name} process failed {len(self._restart_times) + 1} times '
+                                   f'within {self.restart_window:g} s (exit code {process.exitcode})')
+            self._restart_times.append(now)
+            self.restarts += 1
+            print(f'Restarting {name} process after exit code {process.exitcode}')
+            getattr(self, '_start_' + name)()
+
+    def read(self, timeout=0.5):
+        # Returns (Frame, boxes, class_ids, confidences) with boxes in source
+        # frame coordinates, or None when the source is finished
+        while True:
+            try:
+                result = self.results.get(timeout=timeout)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            if result is None:
+                return None
+            seq, src_shape, boxes, class_ids, confidences = result
+            captured = self.ring.view(seq)
+            if captured is not None:
+                captured = captured._replace(image=captured.image.copy())
+                captured = captured._replace(infer_image=captured.image)
+            self.ring.control[READ_SEQ] = seq + 1
+            if captured is None or not self.ring.valid(seq):
+                # Overwritten by newer frames before the display got to it
+                self.frames_dropped += 1
+                continue
+            return captured, boxes, class_ids, confidences
+
+    def close(self):
+        self.stop_event.set()
+        for process in (self.capture, self.inference):
+            if process is not None:
+                process.join(timeout=2)
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+        self.results.cancel_join_thread()
+        self.info.cancel_join_thread()
+        self.ring.close()
@@ -0,0 +1,76 @@
+import numpy as np
+
+
+class SignStateTable:
+    # Alert state of every class as NumPy arrays indexed by class id. Each
+    # frame's detections update all classes in one vectorized step: a class is
+    # confirmed when it was seen in at least k of the last n frames, and a
+    # confirmed class alerts again only after its cooldown. confidence and
+    # boxes hold the best raw detection of each class's latest sighting, which
+    # is what an alert reports. rolling_confidence is an exponential moving
+    # average of the best confidence per frame, seeded with the first
+    # sighting's confidence and decaying while the class is not seen.
+    # important marks classes that get reminders.
+
+    def __init__(self, names, k=3, n=5, cooldown=3.0, smoothing=0.3, thresh=0.5, important=()):
+        # names is model.names, a {class id: name} dict or a list
+        if isinstance(names, dict):
+            self.names = [names.get(i, str(i)) for i in range(max(names) + 1)]
+        else:
+            self.names = list(names)
+        num_classes = len(self.names)
+        self.k = min(k, n)
+        self.n = n
+        self.smoothing = smoothing
+        self.thresh = thresh
+        self.history = np.zeros((n, num_classes), dtype=bool)  # Ring of per-frame sightings
+        self.position = 0
+        self.hits = np.zeros(num_classes, dtype=np.int32)  # Sightings in the last n frames
+        self.confidence = np.zeros(num_classes, dtype=np.float32)  # Best confidence of the latest sighting
+        self.rolling_confidence = np.zeros(num_classes, dtype=np.float32)
+        self.boxes = np.zeros((num_classes, 4), dtype=np.int32)  # Best box of the latest sighting
+        self.cooldown = np.full(num_classes, cooldown, dtype=np.float64)
+        self.last_alert = np.full(num_classes, -np.inf)
+        self.important = np.isin(self.names, list(important))
+
+    def update(self, class_ids, confidences, boxes, now):
+        # Record one frame of detections, returns the ids of the classes that
+        # are confirmed and out of cooldown (their last_alert is set to now)
+        class_ids = np.asarray(class_ids, dtype=np.intp)
+        confidences = np.asarray(confidences, dtype=np.float32)
+        keep = confidences > self.thresh
+        class_ids, confidences, boxes = class_ids[keep], confidences[keep], np.asarray(boxes)[keep]
+
+        # Best detection of each class seen in this frame
+        order = np.lexsort((-confidences, class_ids))
+        seen_ids, first = np.unique(class_ids[order], return_index=True)
+        best = order[first]
+        seen = np.zeros(len(self.names), dtype=bool)
+        seen[seen_ids] = True
+        frame_conf = np.zeros(len(self.names), dtype=np.float32)
+        frame_conf[seen_ids] = confidences[best]
+        self.confidence[seen_ids] = confidences[best]
+        self.boxes[seen_ids] = boxes[best]
+
+        # Rolling confidence, restarted from the raw value when a class shows
+        # up with no sightings in the window
+        self.rolling_confidence += self.smoothing * (frame_conf - self.rolling_confidence)
+        first_sighting = seen & (self.hits == 0)
+        self.rolling_confidence[first_sighting] = frame_conf[first_sighting]
+
+        # k-of-n counts over a ring of the last n frames
+        self.hits += seen.astype(np.int32) - self.history[self.position]
+        self.history[self.position] = seen
+        self.position = (self.position + 1) % self.n
+
+        confirmed = seen & (self.hits >= self.k) & (now - self.last_alert >= self.cooldown)
+        alerts = np.flatnonzero(confirmed)
+        self.last_alert[alerts] = now
+        return alerts
+
+    def reset(self):
+        self.history[:] = False
+        self.hits[:] = 0
+        self.confidence[:] = 0
+        self.rolling_confidence[:] = 0
+        self.last_alert[:] = -np.inf
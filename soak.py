@@ -0,0 +1,246 @@
+import os
+import sys
+import csv
+import time
+import runpy
+import argparse
+import threading
+from collections import Counter
+
+import cv2
+import numpy as np
+
+from sign_state import SignStateTable
+from alert_bus import AlertBus
+
+# Runs a frontend for hours of simulated time on the synthetic source and
+# fails if memory, thread count or frame latency keep growing, or if alerts
+# fire more often than their cooldown allows or not at all. The frontend runs
+# with its frame clock, so cooldowns and reminders follow the synthetic
+# timestamps rather than the wall clock, e.g.
+#   python soak.py --frontend cli --model my_model.pt --hours 2 -- --audio off
+#   python soak.py --frontend gui --hours 2
+# Arguments after "--" are passed on to yolo_detect.py. The GUI always loads
+# my_model.pt and runs on the offscreen Qt platform unless a display is set.
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--frontend', help='Frontend to drive: "cli" (yolo_detect.py) or "gui" (gui_app.py)',
+                    choices=['cli', 'gui'], required=True)
+parser.add_argument('--model', help='Path to YOLO model file for the cli frontend (example: "my_model.pt")')
+parser.add_argument('--folder', help='Image folder for the synthetic source (default: generated frames)', default=None)
+parser.add_argument('--fps', help='Simulated frame rate of the synthetic source (default: 30)', type=float, default=30)
+parser.add_argument('--hours', help='Simulated hours to run (default: 2)', type=float, default=2)
+parser.add_argument('--sample-every', help='Simulated seconds between resource samples (default: 60)', type=float, default=60)
+parser.add_argument('--warmup', help='Simulated seconds before the baseline sample is taken (default: 300)',
+                    type=float, default=300)
+parser.add_argument('--max-rss-growth', help='Allowed RSS growth over the baseline in MB (default: 50)',
+                    type=float, default=50)
+parser.add_argument('--max-thread-growth', help='Allowed thread count growth over the baseline (default: 4)',
+                    type=int, default=4)
+parser.add_argument('--max-latency-drift', help='Allowed rise of the median frame latency over the baseline, \
+                    as a fraction (default: 0.25)', type=float, default=0.25)
+parser.add_argument('--min-alerts', help='Fail if fewer alerts than this fire during the run (default: 1)',
+                    type=int, default=1)
+parser.add_argument('--report', help='Write every sample to this CSV file (example: "soak.csv")', default=None)
+args, frontend_args = parser.parse_known_args()
+if frontend_args[:1] == ['--']:
+    frontend_args = frontend_args[1:]
+
+
+def process_stats():
+    # (RSS in MB, OS threads) of this process. Outside Linux the peak RSS and
+    # Python threads are the closest stand-ins.
+    try:
+        with open('/proc/self/status') as f:
+            fields = dict(line.split(':', 1) for line in f)
+        return int(fields['VmRSS'].split()[0]) / 1024, int(fields['Threads'])
+    except (OSError, KeyError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, threading.active_count()
+
+
+class SoakMonitor:
+    # Collects per-frame latencies and samples process resources every
+    # sample_every simulated seconds. The first sample after warmup is the
+    # baseline, every later sample is checked against the bounds.
+
+    def __init__(self, fps, hours, sample_every, warmup):
+        self.fps = fps
+        self.total_frames = int(hours * 3600 * fps)
+        self.sample_frames = max(1, int(sample_every * fps))
+        self.warmup_frames = int(warmup * fps)
+        self.frames = 0
+        self.latencies = []
+        self.samples = []  # (simulated s, RSS MB, threads, p50 ms, p99 ms)
+        self.baseline = None
+        self.failures = []
+        self.started = time.perf_counter()
+        self.alerts = Counter()  # Alerts per sign name
+        self.reminders = Counter()
+        self.cooldown = None  # Shortest alert cooldown of the frontend's state table
+
+    @property
+    def done(self):
+        return self.frames >= self.total_frames or bool(self.failures)
+
+    def frame(self, latency):
+        self.frames += 1
+        self.latencies.append(latency)
+        if self.frames % self.sample_frames == 0:
+            self.sample()
+
+    def sample(self):
+        rss, threads = process_stats()
+        latencies = np.array(self.latencies) * 1000
+        self.latencies = []
+        sample = (self.frames / self.fps, rss, threads,
+                  float(np.percentile(latencies, 50)), float(np.percentile(latencies, 99)))
+        self.samples.append(sample)
+        print(f'sim {sample[0] / 60:7.1f} min   wall {(time.perf_counter() - self.started) / 60:6.1f} min   '
+              f'RSS {rss:7.1f} MB   threads {threads:3d}   p50 {sample[3]:6.1f} ms   p99 {sample[4]:6.1f} ms')
+        if self.baseline is None:
+            if self.frames >= self.warmup_frames:
+                self.baseline = sample
+            return
+        self.check(sample)
+
+    def check(self, sample):
+        _, rss, threads, p50, _ = sample
+        _, base_rss, base_threads, base_p50, _ = self.baseline
+        if rss - base_rss > args.max_rss_growth:
+            self.failures.append(f'RSS grew {rss - base_rss:.1f} MB over the baseline of {base_rss:.1f} MB')
+        if threads - base_threads > args.max_thread_growth:
+            self.failures.append(f'Thread count grew from {base_threads} to {threads}')
+        if p50 > base_p50 * (1 + args.max_latency_drift):
+            self.failures.append(f'Median frame latency drifted from {base_p50:.1f} ms to {p50:.1f} ms')
+
+
+    def check_alerts(self):
+        # Every class may alert at most once per cooldown of simulated time,
+        # reminders only follow alerts
+        simulated = self.frames / self.fps
+        total = sum(self.alerts.values())
+        print(f'Alerts: {total} ({", ".join(f"{n} {c}" for n, c in self.alerts.most_common())}), '
+              f'reminders: {sum(self.reminders.values())}')
+        if total < args.min_alerts:
+            self.failures.append(f'{total} alerts in {simulated / 3600:.2f} simulated hours, expected at least {args.min_alerts}')
+        if self.cooldown:
+            limit = int(simulated / self.cooldown) + 1
+            for name, count in self.alerts.items():
+                if count > limit:
+                    self.failures.append(f'{name} alerted {count} times, its {self.cooldown:g} s cooldown allows {limit}')
+        for name, count in self.reminders.items():
+            if count > self.alerts[name]:
+                self.failures.append(f'{name} got {count} reminders for {self.alerts[name]} alerts')
+
+
+def watch_alerts(monitor):
+    # Count the alerts the frontend's state table confirms and the reminders
+    # its alert bus publishes
+    update, publish = SignStateTable.update, AlertBus.publish
+
+    def counted_update(table, *a, **k):
+        alerts = update(table, *a, **k)
+        monitor.cooldown = float(table.cooldown.min())
+        monitor.alerts.update(table.names[c] for c in alerts)
+        return alerts
+
+    def counted_publish(bus, event):
+        if event.kind == 'reminder':
+            monitor.reminders[event.name] += 1
+        publish(bus, event)
+
+    SignStateTable.update, AlertBus.publish = counted_update, counted_publish
+
+
+def run_cli(monitor):
+    # Run yolo_detect.py in this process. Frame latency is the time between
+    # two displayed frames; "q" is pressed once the run is over.
+    headless = not os.environ.get('DISPLAY') and sys.platform.startswith('linux')
+    original_imshow, original_waitkey = cv2.imshow, cv2.waitKey
+    last_shown = [None]
+
+    def imshow(name, image):
+        now = time.perf_counter()
+        if last_shown[0] is not None:
+            monitor.frame(now - last_shown[0])
+        last_shown[0] = now
+        if not headless:
+            original_imshow(name, image)
+
+    def waitKey(delay=0):
+        if monitor.done:
+            return ord('q')
+        return -1 if headless else original_waitkey(delay)
+
+    cv2.imshow, cv2.waitKey = imshow, waitKey
+    if headless:
+        # No display to open windows on, the frames are still fully rendered
+        cv2.namedWindow = cv2.setWindowProperty = cv2.destroyAllWindows = lambda *a, **k: None
+
+    source = 'synthetic' + (f':{args.folder}' if args.folder else '') + f'@{args.fps:g}'
+    sys.argv = ['yolo_detect.py', '--model', args.model, '--source', source, '--clock', 'frame'] + frontend_args
+    try:
+        runpy.run_path(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'yolo_detect.py'),
+                       run_name='__main__')
+    except SystemExit:
+        pass
+
+
+def run_gui(monitor):
+    # Run gui_app.py on the offscreen Qt platform. Frame latency is the time
+    # update_frame spends on a frame, polls without a new frame are not counted.
+    if not os.environ.get('DISPLAY'):
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt6.QtWidgets import QApplication
+    import gui_app
+
+    gui_app.CLOCK = 'frame'
+    update_frame = gui_app.TrafficSignApp.update_frame
+
+    def timed_update_frame(window):
+        frames_read = window.cap.frames_read
+        t_start = time.perf_counter()
+        update_frame(window)
+        if window.cap.frames_read != frames_read:
+            monitor.frame(time.perf_counter() - t_start)
+        if monitor.done:
+            window.close()
+            app.quit()
+
+    gui_app.TrafficSignApp.update_frame = timed_update_frame
+    app = QApplication([sys.argv[0]])
+    source = 'synthetic' + (f':{args.folder}' if args.folder else '') + f'@{args.fps:g}'
+    window = gui_app.TrafficSignApp(source)
+    window.show()
+    app.exec()
+
+
+if args.frontend == 'cli' and not args.model:
+    print('ERROR: --model is required for the cli frontend.')
+    sys.exit(2)
+
+monitor = SoakMonitor(args.fps, args.hours, args.sample_every, args.warmup)
+watch_alerts(monitor)
+if args.frontend == 'cli':
+    run_cli(monitor)
+else:
+    run_gui(monitor)
+
+if args.report:
+    with open(args.report, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['sim_seconds', 'rss_mb', 'threads', 'p50_ms', 'p99_ms'])
+        writer.writerows(monitor.samples)
+
+if monitor.frames < monitor.total_frames and not monitor.failures:
+    monitor.failures.append(f'Frontend stopped after {monitor.frames} of {monitor.total_frames} frames')
+elif monitor.baseline is None and not monitor.failures:
+    monitor.failures.append('Run ended before the warmup, no baseline to compare against')
+monitor.check_alerts()
+if monitor.failures:
+    print('SOAK FAILED')
+    for failure in dict.fromkeys(monitor.failures):
+        print(f'    {failure}')
+    sys.exit(1)
+print(f'SOAK PASSED: {monitor.frames / args.fps / 3600:.2f} simulated hours within bounds')
@@ -0,0 +1,148 @@
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+# Remote monitoring of the annotated frames as an MJPEG stream. Open
+# http://<vehicle>:<port>/ in a browser, or use /stream and /snapshot.jpg.
+
+BOUNDARY = b'signframe'
+INDEX_PAGE = b"""<!doctype html>
+<html><head><title>Traffic Sign Detection</title></head>
+<body style="margin:0;background:#000"><img src="/stream" style="width:100%"></body></html>"""
+
+
+class FrameBroadcaster:
+    # Encodes the newest published frame to JPEG at most max_fps times per
+    # second on its own thread and shares the bytes with every viewer.
+    # publish() only stores a reference, so the detection loop never waits on
+    # encoding or on the network. Viewers that fall behind skip to the newest
+    # JPEG instead of queueing old ones.
+
+    def __init__(self, quality=70, max_fps=10):
+        self.quality = quality
+        self.interval = 1.0 / max_fps if max_fps else 0
+        self.viewers = 0
+        self.frames_encoded = 0
+        self._frame = None
+        self._jpeg = None
+        self._jpeg_seq = 0
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def publish(self, frame):
+        # The frame must not be modified after it is published
+        if self.viewers:
+            with self._condition:
+                self._frame = frame
+                self._condition.notify_all()
+
+    def _run(self):
+        next_time = 0
+        while not self._stop.is_set():
+            with self._condition:
+                self._condition.wait_for(lambda: self._frame is not None or self._stop.is_set())
+                frame, self._frame = self._frame, None
+            if frame is None:
+                continue
+            ok, data = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if ok:
+                with self._condition:
+                    self._jpeg = data.tobytes()
+                    self._jpeg_seq += 1
+                    self.frames_encoded += 1
+                    self._condition.notify_all()
+            # Rate limit, frames published meanwhile are replaced by newer ones
+            next_time = max(next_time + self.interval, time.perf_counter())
+            self._stop.wait(next_time - time.perf_counter())
+
+    def latest(self, after_seq=0, timeout=None):
+        # Wait for a JPEG newer than after_seq, returns (seq, bytes)
+        with self._condition:
+            self._condition.wait_for(lambda: self._jpeg_seq > after_seq or self._stop.is_set(), timeout)
+            return self._jpeg_seq, self._jpeg
+
+    def add_viewer(self, count=1):
+        with self._condition:
+            self.viewers += count
+
+    @property
+    def closed(self):
+        return self._stop.is_set()
+
+    def close(self):
+        self._stop.set()
+        with self._condition:
+            self._condition.notify_all()
+        self._thread.join(timeout=1)
+
+
+class StreamHandler(BaseHTTPRequestHandler):
+    broadcaster = None
+
+    def do_GET(self):
+        if self.path == '/':
+            self._send(200, 'text/html', INDEX_PAGE)
+        elif self.path.startswith('/snapshot'):
+            self._snapshot()
+        elif self.path.startswith('/stream'):
+            self._stream()
+        else:
+            self._send(404, 'text/plain', b'not found')
+
+    def _send(self, status, content_type, data):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _snapshot(self):
+        broadcaster = self.broadcaster
+        broadcaster.add_viewer()
+        try:
+            _, jpeg = broadcaster.latest(0, timeout=5)
+        finally:
+            broadcaster.add_viewer(-1)
+        if jpeg is None:
+            self._send(503, 'text/plain', b'no frame yet')
+        else:
+            self._send(200, 'image/jpeg', jpeg)
+
+    def _stream(self):
+        broadcaster = self.broadcaster
+        self.send_response(200)
+        self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=' + BOUNDARY.decode())
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        broadcaster.add_viewer()
+        seq = 0
+        try:
+            while not broadcaster.closed:
+                seq, jpeg = broadcaster.latest(seq, timeout=5)
+                if jpeg is None:
+                    continue
+                self.wfile.write(b'--' + BOUNDARY + b'\r\nContent-Type: image/jpeg\r\nContent-Length: '
+                                 + str(len(jpeg)).encode() + b'\r\n\r\n' + jpeg + b'\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            broadcaster.add_viewer(-1)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stream_server(port, quality=70, max_fps=10, host='0.0.0.0'):
+    # Serve the stream on a background thread, returns the broadcaster to
+    # publish frames to and the server to shut down on exit
+    broadcaster = FrameBroadcaster(quality, max_fps)
+    handler = type('BoundStreamHandler', (StreamHandler,), {'broadcaster': broadcaster})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f'Streaming annotated frames on http://{host}:{port}/')
+    return broadcaster, server
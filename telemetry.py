@@ -0,0 +1,132 @@
+import csv
+import json
+import socket
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+# Vehicle state at a point in time: seconds, km/h and degrees from north
+TelemetrySample = namedtuple('TelemetrySample', ['t', 'speed_kmh', 'heading'])
+
+
+class CsvTelemetry:
+    # Replays a recorded telemetry CSV with columns t, speed_kmh, heading.
+    # t is in seconds on the same clock as the video frame timestamps
+    # (position in the file), shifted by offset if the recordings start apart.
+
+    def __init__(self, path, offset=0.0):
+        with open(path, newline='') as f:
+            rows = list(csv.DictReader(f))
+        if not rows:
+            raise ValueError(f'{path} has no telemetry rows')
+        self.t = np.array([float(r['t']) for r in rows]) + offset
+        self.speed = np.array([float(r['speed_kmh']) for r in rows])
+        self.heading = np.array([float(r.get('heading') or 0) for r in rows])
+        order = np.argsort(self.t)
+        self.t, self.speed, self.heading = self.t[order], self.speed[order], self.heading[order]
+
+    def at(self, t):
+        # Speed is interpolated, heading taken from the last sample
+        idx = max(0, int(np.searchsorted(self.t, t, side='right')) - 1)
+        return TelemetrySample(t, float(np.interp(t, self.t, self.speed)), float(self.heading[idx]))
+
+    def close(self):
+        pass
+
+
+class UdpTelemetry:
+    # Listens for live telemetry datagrams, either JSON {"speed_kmh": .., "heading": ..}
+    # or "speed_kmh,heading" text, and always returns the newest sample
+
+    def __init__(self, port, host='0.0.0.0'):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.settimeout(0.5)
+        self.latest = TelemetrySample(0.0, 0.0, 0.0)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                data = self.sock.recv(1024).decode().strip()
+            except (socket.timeout, OSError, UnicodeDecodeError):
+                continue
+            try:
+                if data.startswith('{'):
+                    fields = json.loads(data)
+                    speed, heading = float(fields['speed_kmh']), float(fields.get('heading', 0))
+                else:
+                    values = data.split(',')
+                    speed, heading = float(values[0]), float(values[1]) if len(values) > 1 else 0.0
+            except (ValueError, KeyError, IndexError):
+                continue
+            self.latest = TelemetrySample(0.0, speed, heading)
+
+    def at(self, t):
+        return self.latest._replace(t=t)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=1)
+        self.sock.close()
+
+
+def open_telemetry(spec):
+    # "drive.csv" replays a file, "udp:5005" listens for live datagrams
+    if spec.startswith('udp:'):
+        return UdpTelemetry(int(spec[4:]))
+    return CsvTelemetry(spec)
+
+
+class SpeedScheduler:
+    # Scales work with vehicle speed. Inference runs at min_fps when parked,
+    # rising linearly to max_fps at full_speed km/h. The region of interest
+    # drops up to max_roi_cut of the frame bottom (road surface and bonnet,
+    # where signs never are) as speed rises. Reminder delays are defined at
+    # reference_speed and shrink at higher speed, since the car covers the
+    # sign's stretch of road sooner.
+
+    def __init__(self, min_fps=2, max_fps=30, full_speed=100, stationary_speed=3,
+                 max_roi_cut=0.35, reference_speed=50):
+        self.min_fps = min_fps
+        self.max_fps = max_fps
+        self.full_speed = full_speed
+        self.stationary_speed = stationary_speed
+        self.max_roi_cut = max_roi_cut
+        self.reference_speed = reference_speed
+        self.last_infer = None
+        self.frames = 0
+        self.inferred = 0
+
+    def _factor(self, speed):
+        if speed < self.stationary_speed:
+            return 0.0
+        return min(1.0, speed / self.full_speed)
+
+    def inference_fps(self, speed):
+        return self.min_fps + (self.max_fps - self.min_fps) * self._factor(speed)
+
+    def should_infer(self, t, speed):
+        self.frames += 1
+        if self.last_infer is not None and t - self.last_infer < 1.0 / self.inference_fps(speed):
+            return False
+        self.last_infer = t
+        self.inferred += 1
+        return True
+
+    def roi(self, frame_shape, speed):
+        # xyxy crop of the frame to run inference on, quantized to 5% steps
+        # so the letterbox geometry does not change on every frame
+        h, w = frame_shape[:2]
+        cut = round(self.max_roi_cut * self._factor(speed) * 20) / 20
+        return 0, 0, w, int(h * (1 - cut))
+
+    def reminder_delay(self, base_delay, speed):
+        # Keep the reminder at the same distance it would have at reference
+        # speed, between half and twice the base delay
+        if speed < self.stationary_speed:
+            return base_delay * 2
+        return float(np.clip(base_delay * self.reference_speed / speed, base_delay / 2, base_delay * 2))
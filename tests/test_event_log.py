@@ -0,0 +1,23 @@
+import numpy as np
+
+from event_log import KIND_ALERT, RECORD_DTYPE, DetectionLogger, read_log
+
+
+def test_record_is_packed_25_bytes():
+    assert RECORD_DTYPE.itemsize == 25
+
+
+def test_round_trip_ignores_partial_record(tmp_path):
+    logger = DetectionLogger(str(tmp_path), {0: 'stop'}, level='all', flush_interval=60)
+    logger.log(1.5, 7, [0, 0], [0.5, 0.75], [[1, 2, 3, 4], [5, 6, 7, 8]])
+    logger.log_alert(1.5, 7, 0, 0.75, (5, 6, 7, 8))
+    logger.close()
+    with open(logger.path, 'ab') as f:
+        f.write(b'\0' * 10)  # Cut off mid-record
+
+    header, records = read_log(logger.path)
+    assert header['labels'] == {'0': 'stop'}
+    assert len(records) == 3
+    assert list(records['kind']) == [0, 0, KIND_ALERT]
+    assert np.allclose(records['conf'], [0.5, 0.75, 0.75])
+    assert records['box'][2].tolist() == [5, 6, 7, 8]
@@ -0,0 +1,99 @@
+import sys
+import types
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+from frame_sources import PicameraSource
+
+MAIN_SIZE = (64, 48)
+LORES_SIZE = (32, 24)
+LORES_STRIDE = 48  # Row stride of the lores plane, wider than the stream
+
+
+class FakeRequest:
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.released = False
+
+    def release(self):
+        self.released = True
+
+
+class FakePicamera2:
+    def __init__(self, index):
+        self.index = index
+        self.config = None
+        self.started = False
+        self.closed = False
+        self.requests = []
+
+    def create_video_configuration(self, **streams):
+        return streams
+
+    def configure(self, config):
+        self.config = config
+
+    def start(self):
+        self.started = True
+
+    def stop(self):
+        self.started = False
+
+    def close(self):
+        self.closed = True
+
+    def capture_request(self):
+        rng = np.random.default_rng(len(self.requests))
+        w, h = MAIN_SIZE
+        main = rng.integers(0, 256, (h, w, 4), dtype=np.uint8)  # XRGB8888 has a padding channel
+        lores_w, lores_h = LORES_SIZE
+        lores = rng.integers(16, 240, (lores_h * 3 // 2, LORES_STRIDE), dtype=np.uint8)
+        request = FakeRequest({'main': main, 'lores': lores})
+        self.requests.append(request)
+        return request
+
+
+@contextmanager
+def fake_mapped_array(request, stream):
+    yield types.SimpleNamespace(array=request.arrays[stream])
+
+
+def fake_picamera2():
+    return types.SimpleNamespace(Picamera2=FakePicamera2, MappedArray=fake_mapped_array)
+
+
+def test_main_and_lores_frames(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'picamera2', fake_picamera2())
+    source = PicameraSource(0, size=MAIN_SIZE, lores_size=LORES_SIZE)
+    camera = source.camera
+    assert camera.started
+    assert camera.config['lores'] == {'format': 'YUV420', 'size': LORES_SIZE}
+
+    frame = source.read()
+    request = camera.requests[-1]
+    assert request.released
+    assert frame.image.shape == (MAIN_SIZE[1], MAIN_SIZE[0], 3)
+    assert np.array_equal(frame.image, request.arrays['main'][:, :, :3])
+
+    # The lores plane is converted with its stride, then cropped to the stream size
+    expected = cv2.cvtColor(request.arrays['lores'], cv2.COLOR_YUV2BGR_I420)[:LORES_SIZE[1], :LORES_SIZE[0]]
+    assert frame.infer_image.shape == (LORES_SIZE[1], LORES_SIZE[0], 3)
+    assert np.array_equal(frame.infer_image, expected)
+
+    # Buffers are reused by the next read
+    second = source.read()
+    assert second.image is frame.image
+    assert second.index == 1
+
+    source.close()
+    assert not camera.started and camera.closed
+
+
+def test_without_lores_infers_on_main():
+    source = PicameraSource(1, size=MAIN_SIZE, provider=fake_picamera2())
+    assert 'lores' not in source.camera.config
+    frame = source.read()
+    assert frame.infer_image is frame.image
+    source.close()
@@ -0,0 +1,48 @@
+import numpy as np
+
+from sign_state import SignStateTable
+
+
+def test_alert_reports_raw_confidence():
+    table = SignStateTable({0: 'stop', 1: 'max speed 100km/h'}, k=1, n=1)
+    boxes = np.array([[0, 0, 10, 10], [5, 5, 20, 20]], dtype=np.float32)
+    alerts = table.update(np.array([1, 1]), np.array([0.6, 0.92]), boxes, now=0.0)
+    assert list(alerts) == [1]
+    assert table.confidence[1] == np.float32(0.92)
+    assert list(table.boxes[1]) == [5, 5, 20, 20]
+
+
+def test_k_of_n_confirmation_and_cooldown():
+    table = SignStateTable(['stop'], k=3, n=5, cooldown=1.0)
+    one = (np.array([0]), np.array([0.6]), np.zeros((1, 4)))
+    alerts = [len(table.update(*one, now=i * 0.1)) for i in range(14)]
+    # Confirmed on the third sighting, then quiet until the cooldown ends
+    assert alerts[:3] == [0, 0, 1]
+    assert sum(alerts[3:12]) == 0
+    assert alerts[12] == 1
+    assert table.confidence[0] == np.float32(0.6)
+
+
+def test_detections_below_threshold_are_ignored():
+    table = SignStateTable(['stop'], k=1, n=1, thresh=0.5)
+    assert len(table.update(np.array([0]), np.array([0.4]), np.zeros((1, 4)), now=0.0)) == 0
+    assert table.hits[0] == 0
+
+
+def test_rolling_confidence_starts_at_first_sighting():
+    table = SignStateTable(['stop', 'yield'], k=1, n=2, smoothing=0.5)
+    box = np.zeros((1, 4))
+    table.update(np.array([0]), np.array([0.8]), box, now=0.0)
+    # Seeded with the raw value, not pulled towards zero
+    assert table.rolling_confidence[0] == np.float32(0.8)
+    assert table.rolling_confidence[1] == 0
+    table.update(np.array([0]), np.array([0.6]), box, now=0.1)
+    assert np.isclose(table.rolling_confidence[0], 0.7)
+    assert table.confidence[0] == np.float32(0.6)
+    # Decays while unseen, then restarts once the window has emptied
+    table.update(np.array([], int), np.array([]), np.zeros((0, 4)), now=0.2)
+    assert np.isclose(table.rolling_confidence[0], 0.35)
+    table.update(np.array([], int), np.array([]), np.zeros((0, 4)), now=0.3)
+    table.update(np.array([0]), np.array([0.9]), box, now=0.4)
+    assert np.isclose(table.rolling_confidence[0], 0.9)
+    assert table.confidence[0] == np.float32(0.9)
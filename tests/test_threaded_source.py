@@ -0,0 +1,32 @@
+import time
+
+from frame_sources import FrameSource, SyntheticSource, ThreadedSource
+
+
+def test_non_live_source_hands_over_every_frame():
+    source = ThreadedSource(SyntheticSource(fps=15, count=20, size=(64, 48)))
+    time.sleep(0.2)  # A live source would have overwritten all but the newest frame by now
+    timestamps = []
+    while (frame := source.read(timeout=1)) is not None:
+        timestamps.append(frame.timestamp)
+    source.close()
+    assert timestamps == [i / 15 for i in range(20)]
+    assert source.frames_dropped == 0
+    assert source.finished
+
+
+class FailingSource(FrameSource):
+    source_type = 'usb'
+    live = True
+    end_message = 'Camera closed.'
+
+    def read(self):
+        raise OSError('device unplugged')
+
+
+def test_reader_exception_finishes_the_source():
+    source = ThreadedSource(FailingSource())
+    assert source.read(timeout=1) is None
+    assert source.finished
+    assert 'device unplugged' in source.end_message
+    source.close()
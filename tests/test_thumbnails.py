@@ -0,0 +1,30 @@
+import numpy as np
+
+from thumbnails import SignCropCache, crop_box
+
+
+def test_best_crop_ages_out():
+    cache = SignCropCache(half_life=2.0)
+    frame = np.zeros((100, 100, 3), np.uint8)
+    assert cache.offer('stop', frame, (0, 0, 40, 40), 0.9, now=0.0)
+    # A smaller crop only wins once the big one has aged enough
+    assert not cache.offer('stop', frame, (0, 0, 20, 20), 0.9, now=1.0)
+    assert cache.offer('stop', frame, (0, 0, 20, 20), 0.9, now=5.0)
+    assert cache.crop('stop').shape == (20, 20, 3)
+
+
+def test_empty_and_outside_boxes_are_not_cached():
+    frame = np.zeros((100, 100, 3), np.uint8)
+    cache = SignCropCache()
+    for box in [(30, 10, 30, 50), (10, 30, 50, 30), (120, 120, 160, 160), (-50, -50, -10, -10)]:
+        assert crop_box(frame, box) is None
+        assert not cache.offer('stop', frame, box, 0.9, now=0.0)
+    assert cache.crop('stop') is None
+
+
+def test_partly_outside_box_is_clamped():
+    frame = np.arange(100 * 100 * 3, dtype=np.uint32).reshape(100, 100, 3).astype(np.uint8)
+    assert np.array_equal(crop_box(frame, (-20, 80, 30, 130)), frame[80:100, 0:30])
+    cache = SignCropCache()
+    assert cache.offer('stop', frame, (90, -10, 120, 40), 0.9, now=0.0)
+    assert cache.crop('stop').shape == (40, 10, 3)
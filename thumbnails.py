@@ -0,0 +1,90 @@
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+def crop_box(frame, box):
+    # Return the frame region inside an xyxy box, clamped to the frame, or
+    # None when the box is empty or lies completely outside
+    h, w = frame.shape[:2]
+    xmin, ymin, xmax, ymax = (int(v) for v in box)
+    xmin, xmax = max(0, xmin), min(w, xmax)
+    ymin, ymax = max(0, ymin), min(h, ymax)
+    if xmax <= xmin or ymax <= ymin:
+        return None
+    return frame[ymin:ymax, xmin:xmax]
+
+
+def make_thumbnail(image, size, color_code=None):
+    # Resize image to fit inside size (w, h) keeping its aspect ratio
+    if image is None or image.size == 0:
+        return None
+    h, w = image.shape[:2]
+    scale = min(size[0] / w, size[1] / h)
+    thumb_w, thumb_h = max(1, int(w * scale)), max(1, int(h * scale))
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+    thumb = cv2.resize(image, (thumb_w, thumb_h), interpolation=interpolation)
+    if color_code is not None:
+        cv2.cvtColor(thumb, color_code, dst=thumb)
+    return thumb
+
+
+class SignCropCache:
+    # Keeps the best crop seen for each sign class, scored by confidence and
+    # box area, and the thumbnails made from it. The cached score halves every
+    # half_life seconds, so a recent crop of a new sighting replaces a sharper
+    # one from long ago. Crops are only copied out of the frame when they beat
+    # the cached one, and thumbnails are only resized when first requested.
+    # The least recently updated class is evicted once max_entries classes
+    # are cached.
+
+    def __init__(self, max_entries=32, half_life=2.0):
+        self.max_entries = max_entries
+        self.half_life = half_life
+        self.entries = OrderedDict()  # class name -> [score, crop, {thumbnail key: thumbnail}, time]
+
+    @staticmethod
+    def score(box, conf):
+        xmin, ymin, xmax, ymax = box
+        return conf * max(0, xmax - xmin) * max(0, ymax - ymin)
+
+    def offer(self, name, frame, box, conf, now=None):
+        # Cache the crop if it is better than the aged score of the current
+        # one for this class. now is the frame time, the monotonic clock if None.
+        if now is None:
+            now = time.monotonic()
+        score = self.score(box, conf)
+        entry = self.entries.get(name)
+        if entry is not None and score <= entry[0] * 0.5 ** ((now - entry[3]) / self.half_life):
+            return False
+        crop = crop_box(frame, box)
+        if crop is None:
+            return False
+        self.entries[name] = [score, np.ascontiguousarray(crop).copy(), {}, now]
+        self.entries.move_to_end(name)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return True
+
+    def crop(self, name):
+        entry = self.entries.get(name)
+        return None if entry is None else entry[1]
+
+    def thumbnail(self, name, size, color_code=None):
+        entry = self.entries.get(name)
+        if entry is None:
+            return None
+        key = (tuple(size), color_code)
+        if key not in entry[2]:
+            entry[2][key] = make_thumbnail(entry[1], size, color_code)
+        return entry[2][key]
+
+    def reset(self, name=None):
+        # Forget one class, or every class, so the next detection is cached
+        # regardless of its score
+        if name is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(name, None)
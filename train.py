@@ -0,0 +1,202 @@
+import os
+import sys
+import shutil
+import argparse
+
+import cv2
+import numpy as np
+import yaml
+from ultralytics import YOLO
+
+# Reproduces the training run recorded in args.yaml locally, then distills
+# the model into a nano student for CPU units and exports it, e.g.
+#   python train.py --data datasets/signs/data.yaml --cache ram
+#   python train.py --tiny    (a few epochs on a generated dataset, checks the pipeline on CPU)
+# The student is trained on the ground truth plus teacher pseudo-labels:
+# confident teacher boxes that no ground truth box covers, and teacher labels
+# for any unlabeled images given with --unlabeled.
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--config', help='Training arguments saved by a previous run (default: args.yaml)', default='args.yaml')
+parser.add_argument('--data', help='Dataset YAML, overrides "data" in --config (example: "datasets/signs/data.yaml")')
+parser.add_argument('--cache', help='Cache decoded images in "ram" or on "disk" for faster epochs, or "off" \
+                    (default: the config\'s cache setting)', choices=['ram', 'disk', 'off'], default=None)
+parser.add_argument('--teacher', help='Trained teacher weights, skips teacher training (example: "runs/distill/teacher/weights/best.pt")')
+parser.add_argument('--student', help='Student model to distill into (default: yolo11n.pt)', default='yolo11n.pt')
+parser.add_argument('--unlabeled', help='Folder of unlabeled images for the teacher to label for the student')
+parser.add_argument('--pseudo-conf', help='Minimum teacher confidence for a pseudo-label (default: 0.5)', type=float, default=0.5)
+parser.add_argument('--formats', help='Comma separated export formats for the student (default: "torchscript,onnx")',
+                    default='torchscript,onnx')
+parser.add_argument('--project', help='Folder for all runs (default: runs/distill)', default='runs/distill')
+parser.add_argument('--device', help='Training device, e.g. "cpu" or "0" (default: the config\'s device)')
+parser.add_argument('--epochs', help='Epochs for teacher and student (default: the config\'s epochs)', type=int)
+parser.add_argument('--tiny', help='Generate a tiny dataset and train briefly on CPU to check the pipeline',
+                    action='store_true')
+args = parser.parse_args()
+
+# Keys of a saved run that describe that run rather than how to train
+RUN_KEYS = ['task', 'mode', 'model', 'data', 'save_dir', 'resume', 'format', 'project', 'name', 'exist_ok', 'source']
+
+TINY_NAMES = ['prohibitory', 'mandatory', 'warning']
+
+
+def make_tiny_dataset(root, n_train=24, n_val=8, size=(320, 240), seed=0):
+    # Grey road scenes with red circles, blue squares and yellow triangles,
+    # the shapes synthetic sources generate, with matching YOLO labels
+    rng = np.random.default_rng(seed)
+    w, h = size
+    for split, count in (('train', n_train), ('val', n_val)):
+        os.makedirs(os.path.join(root, 'images', split), exist_ok=True)
+        os.makedirs(os.path.join(root, 'labels', split), exist_ok=True)
+        for i in range(count):
+            image = np.full((h, w, 3), 90, dtype=np.uint8)
+            image[h // 2:] = 60
+            lines = []
+            for cls in rng.choice(3, size=int(rng.integers(1, 4)), replace=False):
+                r = int(rng.integers(12, 30))
+                x, y = int(rng.integers(r, w - r)), int(rng.integers(r, h - r))
+                if cls == 0:
+                    cv2.circle(image, (x, y), r, (0, 0, 220), -1)
+                    cv2.circle(image, (x, y), int(r * 0.7), (255, 255, 255), -1)
+                elif cls == 1:
+                    cv2.rectangle(image, (x - r, y - r), (x + r, y + r), (200, 80, 0), -1)
+                else:
+                    cv2.fillPoly(image, [np.array([[x, y - r], [x - r, y + r], [x + r, y + r]])], (0, 210, 230))
+                lines.append(f'{cls} {x / w:.6f} {y / h:.6f} {2 * r / w:.6f} {2 * r / h:.6f}')
+            cv2.imwrite(os.path.join(root, 'images', split, f'{i:04d}.jpg'), image)
+            with open(os.path.join(root, 'labels', split, f'{i:04d}.txt'), 'w') as f:
+                f.write('\n'.join(lines) + '\n')
+    data_path = os.path.join(root, 'data.yaml')
+    with open(data_path, 'w') as f:
+        yaml.safe_dump({'path': os.path.abspath(root), 'train': 'images/train', 'val': 'images/val',
+                        'names': dict(enumerate(TINY_NAMES))}, f)
+    return data_path
+
+
+def load_dataset(data_path):
+    # Returns (dataset yaml dict, absolute train image folder, absolute val path)
+    with open(data_path) as f:
+        data = yaml.safe_load(f)
+    root = data.get('path') or os.path.dirname(os.path.abspath(data_path))
+    if not os.path.isabs(root):
+        root = os.path.join(os.path.dirname(os.path.abspath(data_path)), root)
+    train, val = (os.path.join(root, data[split]) for split in ('train', 'val'))
+    if not os.path.isdir(train):
+        raise ValueError(f'Training images must be a folder, got {train}')
+    return data, train, val
+
+
+def label_path(image_path):
+    # YOLO convention: .../images/x.jpg -> .../labels/x.txt
+    head, _, tail = image_path.rpartition(os.sep + 'images' + os.sep)
+    return os.path.splitext(os.path.join(head, 'labels', tail))[0] + '.txt'
+
+
+def read_labels(path):
+    if not os.path.exists(path):
+        return np.zeros((0, 5), np.float32)
+    return np.loadtxt(path, ndmin=2, dtype=np.float32).reshape(-1, 5)
+
+
+def xywh_iou(a, b):
+    # IoU matrix between normalized xywh boxes a (N, 4) and b (M, 4)
+    a0, a1 = a[:, None, :2] - a[:, None, 2:] / 2, a[:, None, :2] + a[:, None, 2:] / 2
+    b0, b1 = b[None, :, :2] - b[None, :, 2:] / 2, b[None, :, :2] + b[None, :, 2:] / 2
+    inter = np.clip(np.minimum(a1, b1) - np.maximum(a0, b0), 0, None).prod(axis=2)
+    return inter / (a[:, None, 2:].prod(axis=2) + b[None, :, 2:].prod(axis=2) - inter + 1e-9)
+
+
+def link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def build_pseudo_dataset(teacher, data, train_dir, val_path, out_root, unlabeled=None):
+    # Student training set: every training image with its ground truth plus
+    # confident teacher boxes that overlap no ground truth box of the same
+    # class, and unlabeled images with teacher labels only
+    image_dir = os.path.join(out_root, 'images', 'train')
+    shutil.rmtree(out_root, ignore_errors=True)
+    os.makedirs(image_dir)
+    os.makedirs(os.path.join(out_root, 'labels', 'train'))
+    sources = [(train_dir, True)] + ([(unlabeled, False)] if unlabeled else [])
+    added = 0
+    for folder, labeled in sources:
+        paths = sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                       if os.path.splitext(name)[1].lower() in ('.jpg', '.jpeg', '.png', '.bmp'))
+        for path in paths:
+            truth = read_labels(label_path(path)) if labeled else np.zeros((0, 5), np.float32)
+            result = teacher.predict(path, conf=args.pseudo_conf, verbose=False)[0]
+            pseudo = np.column_stack([result.boxes.cls.cpu().numpy(), result.boxes.xywhn.cpu().numpy()])
+            if len(truth) and len(pseudo):
+                same_class = pseudo[:, None, 0] == truth[None, :, 0]
+                covered = ((xywh_iou(pseudo[:, 1:], truth[:, 1:]) > 0.5) & same_class).any(axis=1)
+                pseudo = pseudo[~covered]
+            added += len(pseudo)
+            prefix = '' if labeled else 'unlabeled_'
+            name = prefix + os.path.basename(path)
+            link_or_copy(path, os.path.join(image_dir, name))
+            rows = np.vstack([truth, pseudo])
+            np.savetxt(label_path(os.path.join(image_dir, name)), rows, fmt=['%d'] + ['%.6f'] * 4)
+    data_path = os.path.join(out_root, 'data.yaml')
+    with open(data_path, 'w') as f:
+        yaml.safe_dump({'path': os.path.abspath(out_root), 'train': 'images/train', 'val': val_path,
+                        'names': data['names']}, f)
+    print(f'Pseudo-labeled dataset in {out_root}: {added} teacher boxes added')
+    return data_path
+
+
+# Training settings from the saved run, with local overrides
+with open(args.config) as f:
+    config = yaml.safe_load(f)
+train_args = {k: v for k, v in config.items() if k not in RUN_KEYS}
+data_path = args.data or config.get('data')
+if args.tiny:
+    data_path = make_tiny_dataset(os.path.join(args.project, 'tiny_dataset'))
+    train_args.update(epochs=2, imgsz=320, batch=8, workers=0, device='cpu', amp=False, plots=False)
+if args.cache is not None:
+    train_args['cache'] = False if args.cache == 'off' else args.cache
+if args.device is not None:
+    train_args['device'] = args.device
+if args.epochs is not None:
+    train_args['epochs'] = args.epochs
+if not data_path or not os.path.exists(data_path):
+    print(f'ERROR: Dataset YAML "{data_path}" was not found. Pass the local copy with --data.')
+    sys.exit(0)
+try:
+    data, train_dir, val_path = load_dataset(data_path)
+except (ValueError, KeyError) as e:
+    print(f'ERROR: {e}')
+    sys.exit(0)
+project = os.path.abspath(args.project)
+
+# Train (or load) the teacher with the recorded settings
+if args.teacher:
+    teacher_path = args.teacher
+else:
+    teacher = YOLO(config.get('model', 'yolo11s.pt'))
+    teacher.train(data=data_path, project=project, name='teacher', exist_ok=True, **train_args)
+    teacher_path = os.path.join(project, 'teacher', 'weights', 'best.pt')
+teacher = YOLO(teacher_path)
+
+# Distill: train the nano student on ground truth plus teacher pseudo-labels
+pseudo_data = build_pseudo_dataset(teacher, data, train_dir, val_path,
+                                   os.path.join(project, 'pseudo_dataset'), args.unlabeled)
+student = YOLO(args.student)
+student.train(data=pseudo_data, project=project, name='student', exist_ok=True, **train_args)
+student_path = os.path.join(project, 'student', 'weights', 'best.pt')
+student = YOLO(student_path)
+
+# Compare teacher and student on the original validation set
+for name, model in (('teacher', teacher), ('student', student)):
+    metrics = model.val(data=data_path, imgsz=train_args.get('imgsz', 640), device=train_args.get('device'),
+                        project=project, name=f'val_{name}', exist_ok=True, plots=False, verbose=False)
+    print(f'{name}: mAP50 {metrics.box.map50:.3f}, mAP50-95 {metrics.box.map:.3f}')
+
+# Export the student to the runtime formats
+for fmt in filter(None, (f.strip() for f in args.formats.split(','))):
+    exported = student.export(format=fmt, imgsz=train_args.get('imgsz', 640), device=train_args.get('device'))
+    print(f'Exported {fmt}: {exported}')
+print(f'Student weights: {student_path}')
@@ -0,0 +1,61 @@
+import os
+import json
+
+import cv2
+
+# Written by autotune.py and loaded by both frontends at startup
+TUNING_FILE = 'tuning.json'
+
+# inference: torch forward pass, capture: camera/decoder reads,
+# render: resizing, overlays and display
+STAGES = ('inference', 'capture', 'render')
+
+# Stages of the thread that runs the frame loop. Capture runs on a reader
+# thread of its own, this is the layout autotune.py measures.
+MAIN_STAGES = ('inference', 'render')
+
+
+def available_cores():
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def load_tuning(path=TUNING_FILE):
+    # Returns the saved profile, or None if there is none or it was tuned on
+    # a machine with a different core count
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        tuning = json.load(f)
+    if tuning.get('cpu_count') != os.cpu_count():
+        print(f'Ignoring {path}, it was tuned for {tuning.get("cpu_count")} cores. Run autotune.py again.')
+        return None
+    return tuning
+
+
+def pin_thread(cores):
+    # On Linux affinity is per thread, threads started afterwards inherit it
+    if cores and hasattr(os, 'sched_setaffinity'):
+        try:
+            os.sched_setaffinity(0, cores)
+        except OSError as e:
+            print(f'Could not pin to cores {cores}: {e}')
+
+
+def apply_tuning(tuning, stages):
+    # Apply the profile to the calling thread for the stages it runs. Torch
+    # threads are only set where inference runs, so a process that forks
+    # inference workers never starts its own torch thread pool.
+    if tuning is None:
+        return
+    if 'inference' in stages:
+        import torch
+        torch.set_num_threads(tuning['torch_threads'])
+    cv2.setNumThreads(tuning['cv2_threads'])
+    pin_thread(sorted({core for stage in stages for core in tuning[stage + '_cores']}))
+
+
+def describe(tuning):
+    return (f'torch {tuning["torch_threads"]} threads, OpenCV {tuning["cv2_threads"]} threads, '
+            + ', '.join(f'{stage} on {",".join(map(str, tuning[stage + "_cores"]))}' for stage in STAGES))
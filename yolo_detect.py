@@ -1,14 +1,28 @@
 import os
 import sys
 import argparse
-import glob
+import json
 import time
 
 import cv2
 import numpy as np
 from ultralytics import YOLO
-import pyttsx3
-import threading
+
+from preprocess import Letterbox, parse_imgsz, scale_boxes
+from frame_sources import ThreadedSource, open_source
+from thumbnails import SignCropCache
+from event_log import LOG_LEVELS, DetectionLogger
+from shm_pipeline import Pipeline
+from detections import run_detector, to_records
+from stream_server import start_stream_server
+from proposals import CascadeDetector, CascadeEvaluator
+from qos import QosController, build_levels, parse_levels
+from telemetry import SpeedScheduler, open_telemetry
+from detection_cache import DetectionCache
+from profiling import NullProfiler, SlowFrameProfiler
+from tuning import MAIN_STAGES, TUNING_FILE, apply_tuning, describe, load_tuning
+from sign_state import SignStateTable
+from alert_bus import AlertBus, FileSink, MqttSink, OverlaySink, SignEvent, TtsSink, WebhookSink
 
 # Define and parse user input arguments
 
@@ -16,13 +30,17 @@ parser = argparse.ArgumentParser()
 parser.add_argument('--model', help='Path to YOLO model file (example: "runs/detect/train/weights/best.pt")',
                     required=True)
 parser.add_argument('--source', help='Image source, can be image file ("test.jpg"), \
-                    image folder ("test_dir"), video file ("testvid.mp4"), index of USB camera ("usb0"), or index of Picamera ("picamera0")', 
+                    image folder ("test_dir"), video file ("testvid.mp4"), index of USB camera ("usb0"), index of Picamera ("picamera0"), \
+                    network stream ("rtsp://..."), GStreamer pipeline ("gst:..."), or synthetic replay ("synthetic:test_dir@15")', 
                     required=True)
 parser.add_argument('--thresh', help='Minimum confidence threshold for displaying detected objects (example: "0.4")',
                     default=0.5)
 parser.add_argument('--resolution', help='Resolution in WxH to display inference results at (example: "640x480"), \
                     otherwise, match source resolution',
                     default=None)
+parser.add_argument('--imgsz', help='Inference input size, square or WxH (example: "640" or "640x384"). \
+                    Independent of --resolution, which only sets the display size (default: 640, the training size)',
+                    default='640')
 parser.add_argument('--record', help='Record results from video or webcam and save it as "demo1.avi". Must specify --resolution argument to record.',
                     action='store_true')
 parser.add_argument('--notification', help='Enable/disable visual notifications (default: on)',
@@ -33,6 +51,51 @@ parser.add_argument('--reminder', help='Enable/disable reminders (default: on)',
                     choices=['on', 'off'], default='on')
 parser.add_argument('--reminder-duration', help='Duration before showing reminder in seconds (default: 15)',
                     choices=['15', '30'], default='15')
+parser.add_argument('--pipeline', help='Run everything in this process ("single"), or capture and inference in separate \
+                    processes sharing frames through shared memory ("multiprocess") (default: single)',
+                    choices=['single', 'multiprocess'], default='single')
+parser.add_argument('--tuning', help=f'Thread and core profile written by autotune.py, "" to ignore it (default: {TUNING_FILE})',
+                    default=TUNING_FILE)
+parser.add_argument('--cascade', help='Run the model only on colour/shape sign proposals when they are sparse ("on"), \
+                    or run both ways and report recall and CPU saved on exit ("eval") (default: off)',
+                    choices=['off', 'on', 'eval'], default='off')
+parser.add_argument('--qos-levels', help='Model and inference size ladder from best to fastest, switched by frame latency \
+                    (example: "yolo11s.pt@640,yolo11s.pt@480,yolo11n.pt@480,yolo11n.pt@320")', default=None)
+parser.add_argument('--qos-target-ms', help='Frame latency deadline for --qos-levels in milliseconds (default: 100)',
+                    type=float, default=100)
+parser.add_argument('--telemetry', help='Vehicle speed feed that scales inference rate, region and reminder timing: \
+                    CSV with columns t,speed_kmh,heading replayed on the video clock ("drive.csv"), or live UDP ("udp:5005")',
+                    default=None)
+parser.add_argument('--cache', help='Cache detections of image and folder sources in this file (example: "detections.sqlite"), \
+                    so unchanged images are not inferred again on later runs', default=None)
+parser.add_argument('--cache-size', help='Maximum number of images kept in --cache, least recently used are evicted (default: 10000)',
+                    type=int, default=10000)
+parser.add_argument('--print-detections', help='Print the detections of every frame as one JSON line',
+                    action='store_true')
+parser.add_argument('--stream-port', help='Serve the annotated frames as an MJPEG stream on this port (example: "8080")',
+                    type=int, default=None)
+parser.add_argument('--stream-quality', help='JPEG quality of the stream, 1-100 (default: 70)', type=int, default=70)
+parser.add_argument('--stream-fps', help='Maximum frame rate of the stream (default: 10)', type=float, default=10)
+parser.add_argument('--log-level', help='Detections to write to the binary drive log: "alerts" (boxes that fired a notification), \
+                    "all" (every box above threshold) or "off" (default: alerts)',
+                    choices=LOG_LEVELS, default='alerts')
+parser.add_argument('--log-dir', help='Folder for drive logs, summarize them with "python event_log.py logs" (default: logs)',
+                    default='logs')
+parser.add_argument('--clock', help='Time alert cooldowns, reminders and notifications on the wall clock ("wall") \
+                    or on frame timestamps ("frame"), for replaying recordings faster than real time (default: wall)',
+                    choices=['wall', 'frame'], default='wall')
+parser.add_argument('--alert-file', help='Append every alert and reminder as a JSON line to this file (example: "alerts.jsonl")',
+                    default=None)
+parser.add_argument('--mqtt', help='Publish alerts and reminders to this MQTT broker as HOST[:PORT] (example: "localhost")',
+                    default=None)
+parser.add_argument('--mqtt-topic', help='MQTT topic for --mqtt (default: traffic_signs/events)', default='traffic_signs/events')
+parser.add_argument('--webhook', help='POST alerts and reminders as JSON to this URL (example: "http://localhost:9000/signs")',
+                    default=None)
+parser.add_argument('--profile-budget-ms', help='Profile frames that take longer than this many milliseconds: write their \
+                    stage timings and sampled stacks, and a cProfile of the following frames, to --profile-dir (default: off)',
+                    type=float, default=None)
+parser.add_argument('--profile-dir', help='Folder for slow-frame profiles, newest 20 are kept (default: profiles)',
+                    default='profiles')
 
 args = parser.parse_args()
 
@@ -43,6 +106,7 @@ img_source = args.source
 min_thresh = args.thresh
 user_res = args.resolution
 record = args.record
+imgsz = parse_imgsz(args.imgsz)
 
 # Parse new control settings
 show_notification = args.notification == 'on'
@@ -55,34 +119,14 @@ if (not os.path.exists(model_path)):
     print('ERROR: Model path is invalid or model was not found. Make sure the model filename was entered correctly.')
     sys.exit(0)
 
-# Load the model into memory and get labemap
-model = YOLO(model_path, task='detect')
-labels = model.names
-
-# Parse input to determine if image source is a file, folder, video, or USB camera
-img_ext_list = ['.jpg','.JPG','.jpeg','.JPEG','.png','.PNG','.bmp','.BMP']
-vid_ext_list = ['.avi','.mov','.mp4','.mkv','.wmv']
-
-if os.path.isdir(img_source):
-    source_type = 'folder'
-elif os.path.isfile(img_source):
-    _, ext = os.path.splitext(img_source)
-    if ext in img_ext_list:
-        source_type = 'image'
-    elif ext in vid_ext_list:
-        source_type = 'video'
-    else:
-        print(f'File extension {ext} is not supported.')
-        sys.exit(0)
-elif 'usb' in img_source:
-    source_type = 'usb'
-    usb_idx = int(img_source[3:])
-elif 'picamera' in img_source:
-    source_type = 'picamera'
-    picam_idx = int(img_source[8:])
-else:
-    print(f'Input {img_source} is invalid. Please try again.')
-    sys.exit(0)
+# Apply the thread counts and core pinning found by autotune.py. In single
+# mode this thread runs inference and rendering and capture gets a reader
+# thread on its own cores, as autotune.py measured. In multiprocess mode this
+# process only renders, the workers apply their own stages.
+tuning = load_tuning(args.tuning)
+if tuning is not None:
+    apply_tuning(tuning, ['render'] if args.pipeline == 'multiprocess' else MAIN_STAGES)
+    print(f'Using {args.tuning}: {describe(tuning)}')
 
 # Parse user-specified display resolution
 resize = False
@@ -90,9 +134,73 @@ if user_res:
     resize = True
     resW, resH = int(user_res.split('x')[0]), int(user_res.split('x')[1])
 
+# Open the image source (file, folder, video, camera, stream or synthetic). In
+# multiprocess mode the capture and inference processes own the source and model.
+pipeline = None
+try:
+    if args.pipeline == 'multiprocess':
+        pipeline = source = Pipeline(img_source, model_path, imgsz, resolution=(resW, resH) if user_res else None,
+                                     tuning=tuning)
+    else:
+        source = open_source(img_source, resolution=(resW, resH) if user_res else None, imgsz=imgsz)
+        if tuning is not None and source.source_type not in ['image', 'folder']:
+            source = ThreadedSource(source, cores=tuning['capture_cores'])
+except (ValueError, RuntimeError) as e:
+    print(e)
+    sys.exit(0)
+source_type = source.source_type
+
+# Load the model into memory and get labelmap. In multiprocess mode only the
+# inference process loads the model, the pipeline passes its labelmap on.
+if pipeline is None:
+    model = YOLO(model_path, task='detect')
+    labels = model.names
+else:
+    model = None
+    labels = pipeline.names
+
+if pipeline is not None and args.cascade != 'off':
+    print('The proposal cascade only works with --pipeline single. Please try again.')
+    sys.exit(0)
+
+# Open the vehicle telemetry feed and the speed-based scheduler
+telemetry = scheduler = None
+if args.telemetry:
+    if pipeline is not None:
+        print('Telemetry scheduling only works with --pipeline single. Please try again.')
+        sys.exit(0)
+    try:
+        telemetry = open_telemetry(args.telemetry)
+    except (OSError, ValueError, KeyError) as e:
+        print(f'Unable to open telemetry {args.telemetry}: {e}')
+        sys.exit(0)
+    scheduler = SpeedScheduler()
+
+# Preload the model variants of the quality-of-service ladder
+qos = None
+if args.qos_levels:
+    if pipeline is not None or args.cascade != 'off':
+        print('QoS levels only work with --pipeline single and --cascade off. Please try again.')
+        sys.exit(0)
+    try:
+        qos_levels = build_levels(parse_levels(args.qos_levels),
+                                  lambda path: model if path == model_path else YOLO(path, task='detect'))
+    except (ValueError, FileNotFoundError) as e:
+        print(f'Invalid --qos-levels: {e}')
+        sys.exit(0)
+    if any(level.model.names != labels for level in qos_levels):
+        print('All --qos-levels models must have the same classes as --model. Please try again.')
+        sys.exit(0)
+    # Warm up every level so the first switch does not stall a frame
+    for level in qos_levels:
+        run_detector(level.model, [level.letterbox], [np.zeros((480, 640, 3), np.uint8)], level.imgsz)
+    qos = QosController(qos_levels, args.qos_target_ms)
+    model, imgsz, letterbox = qos.current.model, qos.current.imgsz, qos.current.letterbox
+    print(f'QoS: starting at {qos.current.name}')
+
 # Check if recording is valid and set up recording
 if record:
-    if source_type not in ['video','usb']:
+    if source_type not in ['video','usb','picamera','stream','synthetic']:
         print('Recording only works for video and camera sources. Please try again.')
         sys.exit(0)
     if not user_res:
@@ -104,89 +212,106 @@ if record:
     record_fps = 30
     recorder = cv2.VideoWriter(record_name, cv2.VideoWriter_fourcc(*'MJPG'), record_fps, (resW,resH))
 
-# Load or initialize image source
-if source_type == 'image':
-    imgs_list = [img_source]
-elif source_type == 'folder':
-    imgs_list = []
-    filelist = glob.glob(img_source + '/*')
-    for file in filelist:
-        _, file_ext = os.path.splitext(file)
-        if file_ext in img_ext_list:
-            imgs_list.append(file)
-elif source_type == 'video' or source_type == 'usb':
-
-    if source_type == 'video': cap_arg = img_source
-    elif source_type == 'usb': cap_arg = usb_idx
-    cap = cv2.VideoCapture(cap_arg)
-
-    # Set camera or video resolution if specified by user
-    if user_res:
-        # Get the camera's native resolution
-        native_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        native_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        
-        # Only set resolution if it's different from native
-        if resW != native_width or resH != native_height:
-            ret = cap.set(cv2.CAP_PROP_FRAME_WIDTH, resW)
-            ret = cap.set(cv2.CAP_PROP_FRAME_HEIGHT, resH)
-            # Set zoom to 1.0 (normal)
-            cap.set(cv2.CAP_PROP_ZOOM, 1.0)
-            # Set focus to auto
-            cap.set(cv2.CAP_PROP_AUTOFOCUS, 1)
-
-elif source_type == 'picamera':
-    from picamera2 import Picamera2
-    cap = Picamera2()
-    cap.configure(cap.create_video_configuration(main={"format": 'RGB888', "size": (resW, resH)}))
-    cap.start()
+# Set up letterboxing into a reused inference buffer
+if qos is None:
+    letterbox = Letterbox(imgsz)
+
+# Open the detection cache for image and folder sources. Entries are keyed by
+# image content and invalidated when the model file or inference settings change.
+detection_cache = None
+if args.cache and source_type in ['image', 'folder']:
+    if pipeline is not None:
+        print('The detection cache only works with --pipeline single. Please try again.')
+        sys.exit(0)
+    if qos is not None or scheduler is not None:
+        print('The detection cache cannot be combined with --qos-levels or --telemetry. Please try again.')
+        sys.exit(0)
+    detection_cache = DetectionCache(args.cache, model_path, params=f'{imgsz}|{args.cascade}',
+                                     max_entries=args.cache_size)
+
+# Set up the proposal cascade in front of the detector
+cascade = CascadeDetector(model, imgsz) if args.cascade != 'off' else None
+cascade_eval = CascadeEvaluator() if args.cascade == 'eval' else None
+
+# Log detections off the hot path
+event_logger = DetectionLogger(args.log_dir, labels, level=args.log_level)
+
+# Start the remote monitoring stream if requested
+broadcaster = None
+if args.stream_port:
+    broadcaster, stream_server = start_stream_server(args.stream_port, args.stream_quality, args.stream_fps)
+
+# Profile slow frames if requested, every hook is a no-op otherwise
+if args.profile_budget_ms:
+    profiler = SlowFrameProfiler(args.profile_budget_ms, args.profile_dir)
+else:
+    profiler = NullProfiler()
+
+# Cache the best crop of each sign class for notification and reminder thumbnails
+sign_cache = SignCropCache()
+thumbnail_size = (150, 50)  # Max width and height of the notification thumbnail
 
 # Set bounding box colors (using the Tableu 10 color scheme)
 bbox_colors = [(164,120,87), (68,148,228), (93,97,209), (178,182,133), (88,159,106), 
               (96,202,231), (159,124,168), (169,162,241), (98,118,150), (172,176,184)]
 
-# Initialize TTS engine only if audio is enabled
-if enable_audio:
-    engine = pyttsx3.init()
-    engine.setProperty('rate', 150)  # Set speaking rate (optional)
-
-def speak_sign(text):
-    if enable_audio:
-        engine.say(text)
-        engine.runAndWait()
+# Fan alerts out to the overlay, speech and any remote sinks. Every sink has
+# its own bounded queue and thread, so none of them can hold up a frame.
+now = time.time()  # Current time on the --clock, set every frame
+alert_bus = AlertBus(clock=lambda: now)
+overlay_sink = alert_bus.add(OverlaySink())
+tts_sink = alert_bus.add(TtsSink())
+tts_sink.enabled = enable_audio
+if args.alert_file:
+    alert_bus.add(FileSink(args.alert_file))
+if args.mqtt:
+    mqtt_host, _, mqtt_port = args.mqtt.partition(':')
+    try:
+        alert_bus.add(MqttSink(mqtt_host, int(mqtt_port or 1883), args.mqtt_topic))
+    except ValueError as e:
+        print(f'ERROR: {e}')
+        sys.exit(0)
+if args.webhook:
+    alert_bus.add(WebhookSink(args.webhook))
 
 # Initialize control and status variables
-img_count = 0
 notification_duration = 3  # Duration to show notification in seconds
 reminder_interval = 20  # Time in seconds before showing reminder
 reminder_display_duration = 5  # Duration to show reminder notification in seconds
-last_notification_time = 0
+notification_start_time = 0  # Track when notification was shown
 current_notification = None
 current_sign_image = None
 reminder_notification = None
 reminder_sign_image = None
-reminder_scheduled = set()  # Set to track which signs have reminders scheduled
 show_settings_panel = True  # Control panel visibility
 reminder_start_time = 0  # Track when reminder was shown
 
 # Define important signs that should trigger reminders
 IMPORTANT_SIGNS = ['max speed 100km/h', 'caution accident area']
 
-def schedule_reminder(sign_name, sign_image):
-    if enable_reminder and sign_name in IMPORTANT_SIGNS:
-        time.sleep(reminder_interval)
-        if sign_name in reminder_scheduled:
-            global reminder_notification, reminder_sign_image, reminder_start_time
-            reminder_notification = sign_name
-            reminder_sign_image = sign_image
-            reminder_start_time = time.time()  # Record when reminder was shown
-            reminder_scheduled.remove(sign_name)
+# Per-class alert state. A sign alerts once it was seen in 3 of the last 5
+# inferred frames (in any single image of image and folder sources), and
+# the same sign not again for notification_duration seconds.
+confirm_k, confirm_n = (1, 1) if source_type in ['image', 'folder'] else (3, 5)
+sign_state = SignStateTable(labels, k=confirm_k, n=confirm_n, cooldown=notification_duration,
+                            important=IMPORTANT_SIGNS)
 
 def draw_settings_panel(frame):
+    # Settings text with controls
+    settings = [
+        f"Notification: {'ON' if show_notification else 'OFF'} (Press 'N')",
+        f"Audio: {'ON' if enable_audio else 'OFF'} (Press 'A')",
+        f"Reminder: {'ON' if enable_reminder else 'OFF'} (Press 'R')",
+        f"Reminder Time: {reminder_interval}s (Press 'T')",
+        f"Press 'H' to show/hide this panel"
+    ]
+    if qos is not None:
+        settings.append(f"QoS: {qos.current.name} ({qos.index + 1}/{len(qos.levels)})")
+
     # Create a semi-transparent overlay for settings panel
     overlay = frame.copy()
     panel_width = 250  # Increased width to show controls
-    panel_height = 150  # Increased height to show controls
+    panel_height = 25 * len(settings) + 25  # Height grows with the number of controls
     margin = 10
     
     # Draw semi-transparent background
@@ -196,15 +321,7 @@ def draw_settings_panel(frame):
                  (0, 0, 0), -1)
     cv2.addWeighted(overlay, 0.7, frame, 0.3, 0, frame)
     
-    # Draw settings text with controls
-    settings = [
-        f"Notification: {'ON' if show_notification else 'OFF'} (Press 'N')",
-        f"Audio: {'ON' if enable_audio else 'OFF'} (Press 'A')",
-        f"Reminder: {'ON' if enable_reminder else 'OFF'} (Press 'R')",
-        f"Reminder Time: {reminder_interval}s (Press 'T')",
-        f"Press 'H' to show/hide this panel"
-    ]
-    
+    # Draw settings text
     for i, setting in enumerate(settings):
         y_pos = margin + 30 + (i * 25)
         cv2.putText(frame, setting,
@@ -212,62 +329,105 @@ def draw_settings_panel(frame):
                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
 
 # Begin inference loop
+last_detections = (np.zeros((0, 4), np.float32), np.zeros(0, int), np.zeros(0, np.float32))
 while True:
     t_start = time.perf_counter()
-
-    # Load frame from image source
-    if source_type == 'image' or source_type == 'folder':
-        if img_count >= len(imgs_list):
-            print('All images have been processed. Exiting program.')
-            sys.exit(0)
-        img_filename = imgs_list[img_count]
-        frame = cv2.imread(img_filename)
-        img_count = img_count + 1
-    
-    elif source_type == 'video':
-        ret, frame = cap.read()
-        if not ret:
-            print('Reached end of the video file. Exiting program.')
+    profiler.begin_frame()
+    fresh_detections = True  # False on frames the telemetry scheduler skips
+
+    if pipeline is not None:
+        # Frame and detections both come from the worker processes
+        result = pipeline.read()
+        if result is None:
+            print(pipeline.end_message)
             break
-    
-    elif source_type == 'usb':
-        ret, frame = cap.read()
-        if (frame is None) or (not ret):
-            print('Unable to read frames from the camera. This indicates the camera is disconnected or not working. Exiting program.')
-            break
-
-    elif source_type == 'picamera':
-        frame = cap.capture_array()
-        if (frame is None):
-            print('Unable to read frames from the Picamera. This indicates the camera is disconnected or not working. Exiting program.')
-            break
-
-    # Resize frame to desired display resolution
-    if resize == True:
-        frame = cv2.resize(frame,(resW,resH))
+        captured, boxes_xyxy, class_ids, confidences = result
+        frame = captured.image
+        profiler.mark('capture')
 
-    # Run inference on frame
-    results = model(frame, verbose=False)
+        # Resize frame to desired display resolution
+        if resize == True and frame.shape[:2] != (resH, resW):
+            frame = cv2.resize(frame,(resW,resH))
+        boxes_xyxy = scale_boxes(boxes_xyxy, captured.image.shape, frame.shape)
 
-    # Extract results
-    detections = results[0].boxes
+    else:
+        # Load frame from image source
+        captured = source.read()
+        if captured is None:
+            print(source.end_message)
+            break
+        frame = captured.image
+        profiler.mark('capture')
+
+        # Let the vehicle speed decide whether this frame gets inference, and on which region
+        infer_image = captured.infer_image
+        roi_x, roi_y = 0, 0
+        if scheduler is not None:
+            vehicle = telemetry.at(captured.timestamp)
+            fresh_detections = scheduler.should_infer(captured.timestamp, vehicle.speed_kmh)
+            roi_x, roi_y, roi_x1, roi_y1 = scheduler.roi(infer_image.shape, vehicle.speed_kmh)
+            infer_image = infer_image[roi_y:roi_y1, roi_x:roi_x1]
+
+        # Look the image up in the detection cache
+        cache_key = cached = None
+        if detection_cache is not None:
+            cache_key = detection_cache.key_for_file(source.current_path)
+            cached = detection_cache.get(cache_key)
+
+        # Run inference on the letterboxed capture, before any display resizing
+        if not fresh_detections:
+            # Keep showing the last detections between scheduled inferences
+            boxes_xyxy, class_ids, confidences = last_detections
+        elif cached is not None:
+            boxes_xyxy, class_ids, confidences = cached
+        elif cascade is None:
+            boxes_xyxy, class_ids, confidences = run_detector(model, [letterbox], [infer_image], imgsz)[0]
+        elif cascade_eval is None:
+            boxes_xyxy, class_ids, confidences = cascade.detect(infer_image)
+        else:
+            # Run full-frame and cascade inference and keep score, display the cascade result
+            full, full_cpu = cascade_eval.measure(
+                lambda image: run_detector(model, [letterbox], [image], imgsz)[0], infer_image)
+            result, cascade_cpu = cascade_eval.measure(cascade.detect, infer_image)
+            cascade_eval.update(full, result, full_cpu, cascade_cpu)
+            boxes_xyxy, class_ids, confidences = result
+        if cache_key is not None and cached is None:
+            detection_cache.put(cache_key, boxes_xyxy, class_ids, confidences)
+        if fresh_detections and (roi_x or roi_y):
+            boxes_xyxy = boxes_xyxy + np.array([roi_x, roi_y, roi_x, roi_y], dtype=np.float32)
+        last_detections = boxes_xyxy, class_ids, confidences
+
+        # Resize frame to desired display resolution and map boxes to display coordinates
+        if resize == True and frame.shape[:2] != (resH, resW):
+            frame = cv2.resize(frame,(resW,resH))
+        boxes_xyxy = scale_boxes(boxes_xyxy.copy(), captured.infer_image.shape, frame.shape)
+    profiler.mark('inference')
+
+    # Alerts, reminders and notifications run on this frame's time
+    now = captured.timestamp if args.clock == 'frame' else time.time()
+    alert_bus.tick()
+
+    shown = confidences > 0.5
+    if fresh_detections:
+        event_logger.log(captured.timestamp, captured.index, class_ids[shown], confidences[shown], boxes_xyxy[shown])
+    if args.print_detections and fresh_detections:
+        print(json.dumps({'frame': captured.index, 'timestamp': captured.timestamp,
+                          'detections': to_records(labels, boxes_xyxy, class_ids, confidences)}))
 
     # Create a copy of the frame for drawing
     display_frame = frame.copy()
 
     # Go through each detection and get bbox coords, confidence, and class
-    for i in range(len(detections)):
+    for i in range(len(class_ids)):
         # Get bounding box coordinates
-        xyxy_tensor = detections[i].xyxy.cpu()
-        xyxy = xyxy_tensor.numpy().squeeze()
-        xmin, ymin, xmax, ymax = xyxy.astype(int)
+        xmin, ymin, xmax, ymax = boxes_xyxy[i].astype(int)
 
         # Get bounding box class ID and name
-        classidx = int(detections[i].cls.item())
+        classidx = int(class_ids[i])
         classname = labels[classidx]
 
         # Get bounding box confidence
-        conf = detections[i].conf.item()
+        conf = float(confidences[i])
 
         # Draw box if confidence threshold is high enough
         if conf > 0.5:
@@ -283,33 +443,40 @@ while True:
             cv2.putText(display_frame, label, (xmin, label_ymin-7), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
 
-            # Extract the detected sign region
-            sign_region = frame[ymin:ymax, xmin:xmax]
-            
-            # Resize the sign region to a smaller size for display
-            sign_height = 50  # Reduced height for notification
-            aspect_ratio = sign_region.shape[1] / sign_region.shape[0]
-            sign_width = int(sign_height * aspect_ratio)
-            small_sign = cv2.resize(sign_region, (sign_width, sign_height))
-
-            # Update notification and sign image
-            current_time = time.time()
-            if current_time - last_notification_time > notification_duration:
-                current_notification = classname
-                current_sign_image = small_sign
-                last_notification_time = current_time
-                
-                # Speak the sign name in a separate thread if audio is enabled
-                if enable_audio:
-                    threading.Thread(target=speak_sign, args=(classname,), daemon=True).start()
-                
-                # Schedule reminder if enabled and not already scheduled and is an important sign
-                if enable_reminder and classname in IMPORTANT_SIGNS and classname not in reminder_scheduled:
-                    reminder_scheduled.add(classname)
-                    threading.Thread(target=schedule_reminder, args=(classname, small_sign.copy()), daemon=True).start()
+            # Keep the sign region if it is the best one seen for this class. Boxes
+            # carried over from an earlier frame do not match this frame's pixels.
+            if fresh_detections:
+                sign_cache.offer(classname, frame, (xmin, ymin, xmax, ymax), conf, now)
+
+    # Update every class's state in one step, only newly confirmed signs alert
+    alerts = sign_state.update(class_ids, confidences, boxes_xyxy, now) if fresh_detections else []
+    for classidx in alerts:
+        classname = labels[classidx]
+        conf = float(sign_state.confidence[classidx])
+        box = tuple(int(v) for v in sign_state.boxes[classidx])
+        # Only build the thumbnail when a notification actually fires
+        small_sign = sign_cache.thumbnail(classname, thumbnail_size)
+        event_logger.log_alert(captured.timestamp, captured.index, classidx, conf, box)
+        event = SignEvent('alert', classname, int(classidx), conf, box,
+                          captured.timestamp, captured.index, small_sign, time.time())
+        alert_bus.publish(event)
+
+        # Schedule a reminder for important signs, unless one is already pending
+        if enable_reminder and sign_state.important[classidx]:
+            delay = scheduler.reminder_delay(reminder_interval, vehicle.speed_kmh) if scheduler else reminder_interval
+            alert_bus.schedule(event._replace(kind='reminder'), delay)
+
+    # Take the alerts and due reminders for the overlay
+    for event in overlay_sink.poll():
+        if event.kind == 'alert':
+            current_notification, current_sign_image = event.name, event.thumbnail
+            notification_start_time = now
+        elif enable_reminder:
+            reminder_notification, reminder_sign_image = event.name, event.thumbnail
+            reminder_start_time = now
 
     # Display notification if active and enabled
-    if show_notification and current_notification and time.time() - last_notification_time < notification_duration:
+    if show_notification and current_notification and now - notification_start_time < notification_duration:
         # Create semi-transparent overlay for notification
         overlay = display_frame.copy()
         notification_height = 70
@@ -334,9 +501,8 @@ while True:
 
     # Display reminder notification if active and enabled
     if show_notification and enable_reminder and reminder_notification is not None:
-        current_time = time.time()
         # Only show reminder for reminder_display_duration seconds
-        if current_time - reminder_start_time < reminder_display_duration:
+        if now - reminder_start_time < reminder_display_duration:
             # Create semi-transparent overlay for reminder notification
             overlay = display_frame.copy()
             reminder_height = 70
@@ -362,6 +528,13 @@ while True:
             # Clear reminder after duration expires
             reminder_notification = None
             reminder_sign_image = None
+    profiler.mark('draw')
+
+    # Step the quality-of-service level on this frame's processing latency,
+    # frames the telemetry scheduler skipped ran no inference and are left out
+    if qos is not None and fresh_detections and qos.update(time.perf_counter() - t_start):
+        model, imgsz, letterbox = qos.current.model, qos.current.imgsz, qos.current.letterbox
+        event_logger.log_qos(captured.timestamp, captured.index, qos.index)
 
     # Draw settings panel if enabled
     if show_settings_panel:
@@ -371,12 +544,17 @@ while True:
     cv2.namedWindow('YOLO detection results', cv2.WINDOW_NORMAL)
     cv2.setWindowProperty('YOLO detection results', cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
     cv2.imshow('YOLO detection results', display_frame)
+    if broadcaster: broadcaster.publish(display_frame)
     if record: recorder.write(display_frame)
+    profiler.mark('display')
+    profiler.end_frame(frame=captured.index, timestamp=captured.timestamp, source=source_type,
+                       detections=int(shown.sum()), fresh=fresh_detections,
+                       level=qos.current.name if qos is not None else None)
 
     # Handle keyboard input
     if source_type == 'image' or source_type == 'folder':
         key = cv2.waitKey()
-    elif source_type == 'video' or source_type == 'usb' or source_type == 'picamera':
+    else:
         key = cv2.waitKey(5)
     
     if key == ord('q') or key == ord('Q'): # Press 'q' to quit
@@ -389,20 +567,33 @@ while True:
         show_notification = not show_notification
     elif key == ord('a') or key == ord('A'): # Toggle audio
         enable_audio = not enable_audio
-        if enable_audio and 'engine' not in locals():
-            engine = pyttsx3.init()
-            engine.setProperty('rate', 150)
+        tts_sink.enabled = enable_audio
     elif key == ord('r') or key == ord('R'): # Toggle reminders
         enable_reminder = not enable_reminder
+        if not enable_reminder:
+            alert_bus.cancel_scheduled()
     elif key == ord('t') or key == ord('T'): # Toggle reminder duration
         reminder_interval = 30 if reminder_interval == 15 else 15
     elif key == ord('h') or key == ord('H'): # Toggle settings panel visibility
         show_settings_panel = not show_settings_panel
 
 # Clean up
-if source_type == 'video' or source_type == 'usb':
-    cap.release()
-elif source_type == 'picamera':
-    cap.stop()
+source.close()
 if record: recorder.release()
+event_logger.close()
+alert_bus.close()
+print(alert_bus.report())
+profiler.close()
+if args.profile_budget_ms and profiler.slow_frames:
+    print(f'Profiled {profiler.slow_frames} slow frames into {args.profile_dir}.')
+if detection_cache:
+    detection_cache.close()
+    print(f'Detection cache: {detection_cache.hits} images reused, {detection_cache.misses} inferred.')
+if telemetry:
+    telemetry.close()
+    print(f'Telemetry scheduling ran inference on {scheduler.inferred} of {scheduler.frames} frames.')
+if cascade_eval: print(cascade_eval.report())
+if broadcaster:
+    stream_server.shutdown()
+    broadcaster.close()
 cv2.destroyAllWindows()